@@ -0,0 +1,88 @@
+"""
+AI 回答缓存
+相同的 (模型, 系统提示词, 文档上下文, 问题) 直接返回之前的回答，不再请求上游。
+内存中按总字节数做 LRU 淘汰，可选写入 SQLite 以便进程重启后继续命中。
+"""
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+
+from cache import LRUCache
+from models import AIResponse
+
+
+def normalize_message(message):
+    """问题归一化：去掉首尾空白、合并连续空白、忽略大小写"""
+    return ' '.join(message.split()).lower()
+
+
+def make_key(model, system_prompt, context, message):
+    """计算缓存键；上下文按键排序后序列化，字段顺序不同的同一份文档列表得到相同的键"""
+    normalized = json.dumps(
+        [model, (system_prompt or '').strip(), context or [], normalize_message(message)],
+        ensure_ascii=False, sort_keys=True, separators=(',', ':')
+    )
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+class AIResponseCache:
+    """
+    AI 回答缓存
+    max_bytes: 内存缓存的总字节数上限
+    ttl: 回答的有效期（秒）
+    persist: 是否同时写入 AIResponse 表（读写需在 app_context 中进行）
+    """
+
+    def __init__(self, max_bytes=8 * 1024 * 1024, ttl=24 * 3600, persist=False):
+        self.ttl = ttl
+        self.persist = persist
+        self._memory = LRUCache(max_entries=100000, ttl=ttl, max_bytes=max_bytes)
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0, 'db_hits': 0, 'latency_saved_ms': 0.0}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """返回缓存的回答，未命中返回 None"""
+        entry = self._memory.get(key)
+        if entry is None and self.persist:
+            row = AIResponse.get_valid(key)
+            if row is not None:
+                entry = {'content': row.content, 'latency_ms': row.latency_ms}
+                remaining = (row.expires_at - datetime.utcnow()).total_seconds()
+                self._memory.set(key, entry, size=len(row.content.encode('utf-8')), ttl=max(remaining, 1))
+                self._count('db_hits')
+        with self._lock:
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._counters['hits'] += 1
+            self._counters['latency_saved_ms'] += entry['latency_ms']
+        return entry['content']
+
+    def set(self, key, content, latency_ms):
+        """保存回答；latency_ms 为本次上游耗时，之后每次命中都计入节省的时间"""
+        entry = {'content': content, 'latency_ms': round(latency_ms, 2)}
+        self._memory.set(key, entry, size=len(content.encode('utf-8')))
+        if self.persist:
+            AIResponse.put(key, content, entry['latency_ms'], datetime.utcnow() + timedelta(seconds=self.ttl))
+        self._count('stores')
+
+    def clear(self):
+        """清空缓存（模型或系统提示词变化时调用）"""
+        self._memory.clear()
+        if self.persist:
+            AIResponse.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+        memory = self._memory.stats()
+        stats.update({'entries': memory['entries'], 'bytes': memory['bytes'], 'evictions': memory['evictions']})
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+        stats['latency_saved_ms'] = round(stats['latency_saved_ms'], 2)
+        return stats
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
@@ -1,24 +1,45 @@
 import os
-import html
-import re
+import codecs
+import time
 from datetime import datetime, date, timedelta
-from urllib.parse import urlparse, urljoin, quote
-from urllib.request import Request, urlopen
+from urllib.parse import urlparse
 import json
-from flask import Flask, request, jsonify, render_template, redirect, send_from_directory, abort
+import mimetypes
+import click
+from flask import Flask, request, jsonify, render_template, redirect, send_from_directory, send_file, abort, g
+from werkzeug.security import safe_join
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
-from models import db, Visit, Comment, User, SystemConfig
-from sqlalchemy import func
+from models import db, Visit, VisitDailyRollup, Comment, User, SystemConfig, AIResponse
+from migrations import SCHEMA_VERSION, run_migrations, explain_report
+from stats import VisitBuffer, VisitDedupIndex, TopArticlesBoard
+from cache import LRUCache
+from quota import DailyQuota, SlidingWindowLimiter
+from upstream import UpstreamPool, UpstreamError, UpstreamBusy, SingleFlight
+from proxy_cache import ProxyCache
+from ai_cache import AIResponseCache, make_key as make_ai_cache_key
+from articles import ArticleIndex, resolve_article_path
+from render import ArticleRenderer
+from assets import AssetManifest, build_assets, is_fingerprinted
+from shell import ShellRenderer
+from compression import ResponseCompressor, precompress_tree, precompressed_variant, is_compressible
+from article_search import ArticleSearch
+from proxy_rewrite import StreamingHTMLRewriter, rewrite_css_for_proxy, benchmark as benchmark_proxy_rewrite
+from sqlalchemy import func, and_, or_, event
+from sqlalchemy.orm import joinedload
 from functools import wraps
 
 # ==========================================
 # 配置与初始化
 # ==========================================
 
+# 记录进程开始加载应用的时间，用于统计冷启动耗时
+_boot_started = time.perf_counter()
+
 # 将静态文件和模板文件夹都指向本地的 'frontend' 目录
 # 这样 Flask 可以直接服务前端构建产物
-app = Flask(__name__, static_folder='frontend', template_folder='frontend')
+# 不注册 Flask 内置的 static 路由：/frontend/ 下的资源统一由 serve_frontend_static 处理（CDN 重定向、缓存头）
+app = Flask(__name__, static_folder=None, template_folder='frontend')
 CORS(app)  # 允许跨域请求，方便开发调试
 
 # 基础路径配置
@@ -29,6 +50,39 @@ db_path = os.path.join(basedir, 'data', 'blog.db')
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + db_path
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+# SQLite 性能参数，每个新连接建立时通过 PRAGMA 应用
+# SQLITE_PROFILE=wal (默认): WAL 日志 + synchronous=NORMAL，读写互不阻塞，提交时不再每次完整 fsync
+# SQLITE_PROFILE=off: 保持 SQLite 默认行为
+SQLITE_PROFILES = {
+    'off': {},
+    'wal': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')),
+        'mmap_size': int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+        'cache_size': int(os.environ.get('SQLITE_CACHE_SIZE', '-20000')),  # 负数单位为 KiB
+        'temp_store': 'MEMORY',
+    },
+}
+sqlite_profile = os.environ.get('SQLITE_PROFILE', 'wal').strip().lower()
+if sqlite_profile not in SQLITE_PROFILES:
+    raise RuntimeError(
+        f"Invalid SQLITE_PROFILE={os.environ.get('SQLITE_PROFILE')!r}, "
+        f"expected one of: {', '.join(sorted(SQLITE_PROFILES))}"
+    )
+app.config['SQLITE_PRAGMAS'] = SQLITE_PROFILES[sqlite_profile]
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': int(os.environ.get('SQLALCHEMY_POOL_SIZE', '10')),
+    'max_overflow': int(os.environ.get('SQLALCHEMY_MAX_OVERFLOW', '20')),
+    'pool_timeout': int(os.environ.get('SQLALCHEMY_POOL_TIMEOUT', '10')),
+    'connect_args': {
+        # 与 busy_timeout 一致：遇到写锁时等待而不是立即报错
+        'timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', '5000')) / 1000.0,
+        # 连接由连接池在线程间复用
+        'check_same_thread': False,
+    },
+}
+
 # JWT 配置
 app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', 'your-secret-key-change-in-production')
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=7)
@@ -40,33 +94,350 @@ app.config['ADMIN_PASSWORD'] = os.environ.get('ADMIN_PASSWORD', 'admin')
 # CDN 配置：如果设置了环境变量，静态资源将重定向到 CDN
 CDN_URL = os.environ.get('CDN_URL')
 
+# 访问统计写缓冲配置：开启后访问记录先入队，由后台线程按时间/条数批量落库
+app.config['VISIT_BUFFER_ENABLED'] = os.environ.get('VISIT_BUFFER_ENABLED', 'true').lower() == 'true'
+app.config['VISIT_FLUSH_INTERVAL_MS'] = int(os.environ.get('VISIT_FLUSH_INTERVAL_MS', '500'))
+app.config['VISIT_FLUSH_MAX_ROWS'] = int(os.environ.get('VISIT_FLUSH_MAX_ROWS', '200'))
+# 多进程部署时开启：内存去重索引未命中时再查一次数据库
+app.config['VISIT_DEDUP_DB_FALLBACK'] = os.environ.get('VISIT_DEDUP_DB_FALLBACK', 'false').lower() == 'true'
+# 系统配置缓存检查版本号的间隔（秒），其他进程修改配置后最多延迟这么久生效
+app.config['CONFIG_CACHE_CHECK_SECONDS'] = float(os.environ.get('CONFIG_CACHE_CHECK_SECONDS', '1'))
+SystemConfig.CACHE_CHECK_SECONDS = app.config['CONFIG_CACHE_CHECK_SECONDS']
+# 热门文章排行榜从访问日汇总表重新加载的间隔（秒），0 表示只在启动时加载
+app.config['TOP_ARTICLES_REFRESH_SECONDS'] = int(os.environ.get('TOP_ARTICLES_REFRESH_SECONDS', '300'))
+# 评论分页：每页默认/最大条数，以及各文章首页评论缓存的有效期（秒）
+app.config['COMMENTS_PAGE_SIZE'] = int(os.environ.get('COMMENTS_PAGE_SIZE', '20'))
+app.config['COMMENTS_MAX_PAGE_SIZE'] = int(os.environ.get('COMMENTS_MAX_PAGE_SIZE', '100'))
+app.config['COMMENTS_CACHE_TTL'] = int(os.environ.get('COMMENTS_CACHE_TTL', '60'))
+# 频率限制：评论按用户/IP 每日计数，登录、注册和 AI 对话按 IP 滑动窗口计数
+app.config['COMMENT_DAILY_LIMIT'] = int(os.environ.get('COMMENT_DAILY_LIMIT', '10'))
+app.config['COMMENT_IP_DAILY_LIMIT'] = int(os.environ.get('COMMENT_IP_DAILY_LIMIT', '30'))
+app.config['LOGIN_RATE_LIMIT'] = (int(os.environ.get('LOGIN_RATE_LIMIT', '10')), 300)  # (次数, 窗口秒数)
+app.config['REGISTER_RATE_LIMIT'] = (int(os.environ.get('REGISTER_RATE_LIMIT', '5')), 3600)
+app.config['AI_CHAT_RATE_LIMIT'] = (int(os.environ.get('AI_CHAT_RATE_LIMIT', '20')), 600)
+# 全文检索：两次检查文章文件变化之间的最短间隔（秒）
+app.config['SEARCH_REINDEX_SECONDS'] = float(os.environ.get('SEARCH_REINDEX_SECONDS', '5'))
+# AI 流式对话：上游两次数据之间的最长等待时间（秒）和同时进行的对话数上限
+app.config['AI_TIMEOUT'] = float(os.environ.get('AI_TIMEOUT', '30'))
+app.config['AI_MAX_CONCURRENT'] = int(os.environ.get('AI_MAX_CONCURRENT', '32'))
+# AI 对话附带的相关文档数量上限
+app.config['AI_CONTEXT_TOP_K'] = int(os.environ.get('AI_CONTEXT_TOP_K', '8'))
+# AI 回答缓存：有效期（秒，0 表示关闭缓存）、内存字节上限，以及是否持久化到 SQLite
+app.config['AI_CACHE_TTL'] = int(os.environ.get('AI_CACHE_TTL', str(24 * 3600)))
+app.config['AI_CACHE_MAX_BYTES'] = int(os.environ.get('AI_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+app.config['AI_CACHE_PERSIST'] = os.environ.get('AI_CACHE_PERSIST', 'true').lower() == 'true'
+# 页面代理 (/api/ifm-proxy) 的上游连接池配置
+app.config['PROXY_TIMEOUT'] = float(os.environ.get('PROXY_TIMEOUT', '8'))
+app.config['PROXY_MAX_IDLE_PER_HOST'] = int(os.environ.get('PROXY_MAX_IDLE_PER_HOST', '4'))
+app.config['PROXY_IDLE_TIMEOUT'] = float(os.environ.get('PROXY_IDLE_TIMEOUT', '30'))
+app.config['PROXY_CHUNK_SIZE'] = int(os.environ.get('PROXY_CHUNK_SIZE', str(64 * 1024)))
+# 每个上游主机的并发请求上限、排队上限和排队等待时间（秒），以及相同 GET 请求合并时的最长等待时间（秒）
+app.config['PROXY_MAX_ACTIVE_PER_HOST'] = int(os.environ.get('PROXY_MAX_ACTIVE_PER_HOST', '8'))
+app.config['PROXY_MAX_WAITING_PER_HOST'] = int(os.environ.get('PROXY_MAX_WAITING_PER_HOST', '16'))
+app.config['PROXY_QUEUE_TIMEOUT'] = float(os.environ.get('PROXY_QUEUE_TIMEOUT', '5'))
+app.config['PROXY_COALESCE_WAIT'] = float(os.environ.get('PROXY_COALESCE_WAIT', '15'))
+# 页面代理响应缓存：内存字节上限、上游未声明缓存策略时的有效期，以及可选的磁盘二级缓存
+app.config['PROXY_CACHE_MAX_BYTES'] = int(os.environ.get('PROXY_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+app.config['PROXY_CACHE_DEFAULT_TTL'] = int(os.environ.get('PROXY_CACHE_DEFAULT_TTL', '60'))
+app.config['PROXY_CACHE_SPILL'] = os.environ.get('PROXY_CACHE_SPILL', 'false').lower() == 'true'
+app.config['PROXY_CACHE_SPILL_MAX_BYTES'] = int(os.environ.get('PROXY_CACHE_SPILL_MAX_BYTES', str(256 * 1024 * 1024)))
+# 首页直接内联 main.html、资源清单和首屏关键样式，以及提取关键样式的 CSS 文件（逗号分隔，相对于 frontend）
+app.config['SHELL_INLINE'] = os.environ.get('SHELL_INLINE', 'true').lower() == 'true'
+app.config['SHELL_CRITICAL_CSS'] = [
+    path.strip() for path in
+    os.environ.get('SHELL_CRITICAL_CSS', 'css/bootstrap.min.css,css/main.css,css/components.css').split(',')
+    if path.strip()
+]
+# 动态 JSON 响应压缩：最小压缩大小（字节）、压缩级别，以及压缩结果缓存的字节上限
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', '1024'))
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', '6'))
+app.config['COMPRESS_CACHE_MAX_BYTES'] = int(os.environ.get('COMPRESS_CACHE_MAX_BYTES', str(8 * 1024 * 1024)))
+
+# 系统配置默认值，启动时写入数据库中缺失的键
+DEFAULT_CONFIG = {
+    'auto_approve_users': 'false',
+    'auto_approve_comments': 'false',
+    # AI 助手配置
+    'ai_enabled': 'false',
+    'ai_api_url': 'https://open.bigmodel.cn/api/paas/v4/chat/completions',
+    'ai_api_key': '',
+    'ai_model': 'glm-4.5-flash',
+    'ai_system_prompt': '你是一个智能文档助手。请根据提供的文档列表回答用户的问题。回答请使用 Markdown 格式，保持简洁明了。'
+}
+
 # 初始化数据库插件
 db.init_app(app)
 jwt = JWTManager(app)
 
-# 应用启动时确保数据目录和数据库表存在
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """新连接建立时应用 SQLite 性能参数"""
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in app.config['SQLITE_PRAGMAS'].items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
 with app.app_context():
-    data_dir = os.path.join(basedir, 'data')
-    if not os.path.exists(data_dir):
-        os.makedirs(data_dir)
-    db.create_all()
-    
-    # 初始化系统配置
-    if not SystemConfig.query.filter_by(key='auto_approve_users').first():
-        SystemConfig.set('auto_approve_users', 'false')
-    if not SystemConfig.query.filter_by(key='auto_approve_comments').first():
-        SystemConfig.set('auto_approve_comments', 'false')
-    # AI 助手配置
-    if not SystemConfig.query.filter_by(key='ai_enabled').first():
-        SystemConfig.set('ai_enabled', 'false')
-    if not SystemConfig.query.filter_by(key='ai_api_url').first():
-        SystemConfig.set('ai_api_url', 'https://open.bigmodel.cn/api/paas/v4/chat/completions')
-    if not SystemConfig.query.filter_by(key='ai_api_key').first():
-        SystemConfig.set('ai_api_key', '')
-    if not SystemConfig.query.filter_by(key='ai_model').first():
-        SystemConfig.set('ai_model', 'glm-4.5-flash')
-    if not SystemConfig.query.filter_by(key='ai_system_prompt').first():
-        SystemConfig.set('ai_system_prompt', '你是一个智能文档助手。请根据提供的文档列表回答用户的问题。回答请使用 Markdown 格式，保持简洁明了。')
+    event.listen(db.engine, 'connect', apply_sqlite_pragmas)
+
+
+@app.cli.command('backfill-rollup')
+def backfill_rollup_command():
+    """根据 Visit 表重建访问日汇总: flask --app app backfill-rollup"""
+    if visit_buffer:
+        visit_buffer.flush()
+    rows = VisitDailyRollup.rebuild()
+    print(f'Visit rollup rebuilt: {rows} rows')
+
+
+@app.cli.command('migrate')
+def migrate_command():
+    """执行未完成的数据库迁移: flask --app app migrate"""
+    previous = run_migrations()
+    print(f'Schema version: {previous} -> {SCHEMA_VERSION}')
+
+
+@app.cli.command('bench-proxy-rewrite')
+def bench_proxy_rewrite_command():
+    """对比页面代理新旧 HTML 重写实现的耗时: flask --app app bench-proxy-rewrite"""
+    for size_mb in (1, 4, 16):
+        print(benchmark_proxy_rewrite(size=size_mb * 1024 * 1024))
+
+
+@app.cli.command('render-articles')
+def render_articles_command():
+    """预先渲染所有 Markdown 文章并清理过期的渲染结果（部署时执行）: flask --app app render-articles"""
+    if not article_renderer.available:
+        print('Python-Markdown is not installed (pip install markdown)')
+        return
+    keep = set()
+    rendered = 0
+    started = time.perf_counter()
+    for article in article_index.articles():
+        path = resolve_article_path(frontend_dir, article)
+        if article['type'] != 'md' or not path or not os.path.exists(path):
+            continue
+        digest, result = article_renderer.render(path)
+        keep.add(digest)
+        rendered += 1
+        print(f"{article['slug']}: {len(result['html'])} bytes, {len(result['outline'])} headings")
+    removed = article_renderer.prune(keep)
+    print(f'Rendered {rendered} articles in {(time.perf_counter() - started) * 1000:.1f} ms, '
+          f'removed {removed} stale files')
+
+
+@app.cli.command('build-assets')
+@click.option('--prune', is_flag=True, help='删除 dist/ 中不属于本次构建的旧文件')
+@click.option('--no-bundle', is_flag=True, help='不合并资源清单中的 CSS/JS，每个文件单独加载')
+def build_assets_command(prune, no_bundle):
+    """按内容哈希构建前端静态资源到 frontend/dist/（部署时执行）: flask --app app build-assets"""
+    result = build_assets(frontend_dir, prune=prune, bundle=not no_bundle)
+    for source, target in result['files'].items():
+        print(f'{source} -> {target}')
+    for target, sources in result['bundles'].items():
+        print(f'{target} <- {len(sources)} files')
+    for name, key in result['manifests'].items():
+        print(f'{name}-map.json -> {key}-map.json')
+    for source in result['missing']:
+        print(f'missing: {source}')
+    print(f"Built {len(result['files'])} assets, removed {result['removed']} stale files")
+
+
+@app.cli.command('compress-assets')
+def compress_assets_command():
+    """为 frontend/ 下的可压缩文件生成 .gz / .br 预压缩版本（在 build-assets 之后执行）: flask --app app compress-assets"""
+    started = time.perf_counter()
+    result = precompress_tree(frontend_dir, min_size=app.config['COMPRESS_MIN_BYTES'])
+    print(f"Wrote {result['written']} files ({result['bytes_in']} -> {result['bytes_out']} bytes), "
+          f"skipped {result['skipped']} up-to-date, removed {result['removed']} "
+          f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+@app.cli.command('explain-queries')
+def explain_queries_command():
+    """输出高频查询在有无组合索引时的执行计划: flask --app app explain-queries"""
+    print(explain_report(db_path))
+
+
+# 文章索引 (frontend/md-map.json)，文件修改后自动重新加载；文章路径相对于 frontend 目录
+frontend_dir = os.path.join(basedir, 'frontend')
+article_index = ArticleIndex(os.path.join(frontend_dir, 'md-map.json'))
+article_search = ArticleSearch(
+    article_index,
+    frontend_dir,
+    reindex_interval=app.config['SEARCH_REINDEX_SECONDS']
+)
+# Markdown 渲染结果按源文件哈希缓存在内存和 data/rendered/ 中
+article_renderer = ArticleRenderer(cache_dir=os.path.join(basedir, 'data', 'rendered'))
+# build-assets 的构建结果，模板通过 asset_path() 引用带哈希的文件名
+asset_manifest = AssetManifest(frontend_dir)
+app.jinja_env.globals['asset_path'] = asset_manifest.asset_path
+# 内联了外壳的首页，按 CDN 地址缓存，相关文件修改后重新渲染
+shell_renderer = ShellRenderer(frontend_dir, asset_manifest, app.jinja_env,
+                               critical_css=app.config['SHELL_CRITICAL_CSS'])
+
+# 带内容哈希的构建产物可永久缓存
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+visit_dedup = VisitDedupIndex(app, db_fallback=app.config['VISIT_DEDUP_DB_FALLBACK'])
+top_articles = TopArticlesBoard(refresh_seconds=app.config['TOP_ARTICLES_REFRESH_SECONDS'])
+
+
+def _on_visits_flushed(rows):
+    """批量写入提交成功后才计入排行榜"""
+    for row in rows:
+        top_articles.add(row['path'], row['timestamp'].date())
+
+
+def _on_visits_dropped(rows):
+    """批量写入失败时撤销去重登记，这些访客之后再次访问仍会被记录"""
+    for row in rows:
+        visit_dedup.discard(row['ip_address'], row['path'])
+
+
+visit_buffer = VisitBuffer(
+    app,
+    flush_interval_ms=app.config['VISIT_FLUSH_INTERVAL_MS'],
+    max_rows=app.config['VISIT_FLUSH_MAX_ROWS'],
+    on_flushed=_on_visits_flushed,
+    on_dropped=_on_visits_dropped
+) if app.config['VISIT_BUFFER_ENABLED'] else None
+
+# 启动耗时统计，可通过 /api/admin/startup 查看
+STARTUP_STATS = {}
+
+
+def bootstrap():
+    """
+    应用启动初始化，每个 worker 进程执行一次
+    结构版本一致时跳过建表；配置整表读取一次，缺失的默认值一次性写入
+    """
+    stages = {}
+
+    def mark(name, since):
+        now = time.perf_counter()
+        stages[name] = round((now - since) * 1000, 2)
+        return now
+
+    started = time.perf_counter()
+    with app.app_context():
+        # 确保数据目录和数据库表存在
+        data_dir = os.path.join(basedir, 'data')
+        if not os.path.exists(data_dir):
+            os.makedirs(data_dir)
+        # 结构版本一致时不做任何建表操作
+        previous_version = run_migrations()
+        step = mark('schema', started)
+
+        # 初始化系统配置（只写入缺失的键）
+        seeded = SystemConfig.ensure_defaults(DEFAULT_CONFIG)
+        if app.config['AI_CACHE_PERSIST']:
+            AIResponse.purge_expired()
+        step = mark('config', step)
+
+        visit_dedup.rebuild()
+        top_articles.reload()
+        step = mark('stats', step)
+
+        article_search.sync(force=True)
+        mark('search', step)
+
+    finished = time.perf_counter()
+    STARTUP_STATS.update({
+        'pid': os.getpid(),
+        'ready_at': datetime.utcnow().isoformat(),
+        'schema_version': SCHEMA_VERSION,
+        'schema_upgraded_from': previous_version if previous_version < SCHEMA_VERSION else None,
+        'seeded_config_keys': sorted(seeded),
+        'bootstrap_ms': round((finished - started) * 1000, 2),
+        'total_ms': round((finished - _boot_started) * 1000, 2),
+        'stages_ms': stages
+    })
+    app.logger.info('Startup finished in %.2f ms (bootstrap %.2f ms)',
+                    STARTUP_STATS['total_ms'], STARTUP_STATS['bootstrap_ms'])
+
+
+bootstrap()
+
+
+# ==========================================
+# 频率限制
+# ==========================================
+
+def _comments_today(user_id):
+    """用户今天已发表的评论数（每个用户每天只查询一次，用于初始化计数器）"""
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    return Comment.query.filter(
+        Comment.user_id == user_id,
+        Comment.timestamp >= today_start
+    ).count()
+
+
+def _ip_comments_today(ip_address):
+    """该 IP 今天已发表的评论数（每个 IP 每天只查询一次，重启或新 worker 不会清零计数）"""
+    today_start = datetime.combine(date.today(), datetime.min.time())
+    return Comment.query.filter(
+        Comment.ip_address == ip_address,
+        Comment.timestamp >= today_start
+    ).count()
+
+
+comment_user_quota = DailyQuota(app.config['COMMENT_DAILY_LIMIT'], seed=_comments_today)
+comment_ip_quota = DailyQuota(app.config['COMMENT_IP_DAILY_LIMIT'], seed=_ip_comments_today)
+login_limiter = SlidingWindowLimiter(*app.config['LOGIN_RATE_LIMIT'])
+register_limiter = SlidingWindowLimiter(*app.config['REGISTER_RATE_LIMIT'])
+ai_chat_limiter = SlidingWindowLimiter(*app.config['AI_CHAT_RATE_LIMIT'])
+
+
+def check_quota(limiter, key):
+    """
+    使用一次配额，并记录结果用于生成响应头
+    同一请求检查多个配额时，响应头展示剩余次数最少的那个
+    """
+    result = limiter.acquire(key)
+    current = g.get('rate_limit')
+    if current is None or not result.allowed or (current.allowed and result.remaining < current.remaining):
+        g.rate_limit = result
+    return result
+
+
+def rate_limited(limiter):
+    """按客户端 IP 限流的装饰器，超限时返回 429"""
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not check_quota(limiter, request.remote_addr).allowed:
+                return jsonify({'error': 'Too many requests'}), 429
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+response_compressor = ResponseCompressor(
+    min_bytes=app.config['COMPRESS_MIN_BYTES'],
+    level=app.config['COMPRESS_LEVEL'],
+    max_bytes=app.config['COMPRESS_CACHE_MAX_BYTES']
+)
+
+
+@app.after_request
+def compress_response(response):
+    """压缩较大的 JSON 响应（客户端支持 gzip/br 时）"""
+    return response_compressor.apply(request, response)
+
+
+@app.after_request
+def add_rate_limit_headers(response):
+    """在响应头中返回剩余配额"""
+    result = g.get('rate_limit')
+    if result is not None:
+        response.headers.update(result.headers())
+        if not result.allowed:
+            response.headers['Retry-After'] = str(max(int(result.reset_at - time.time()), 1))
+    return response
 
 
 # ==========================================
@@ -116,7 +487,23 @@ def serve_frontend_static(filename):
     """
     if CDN_URL:
         return redirect(f"{CDN_URL}/frontend/{filename}")
-    return send_from_directory('frontend', filename)
+    max_age = IMMUTABLE_MAX_AGE if is_fingerprinted(filename) else None
+    if not is_compressible(filename):
+        response = send_from_directory('frontend', filename, max_age=max_age)
+    else:
+        # 有不旧于源文件的预压缩版本（compress-assets 生成）且客户端接受该编码时直接返回
+        path = safe_join(frontend_dir, filename)
+        variant, encoding = precompressed_variant(path, request.accept_encodings) if path else (None, None)
+        if variant:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_file(variant, mimetype=mimetype, max_age=max_age, conditional=True)
+            response.headers['Content-Encoding'] = encoding
+        else:
+            response = send_from_directory('frontend', filename, max_age=max_age)
+        response.vary.add('Accept-Encoding')
+    if max_age:
+        response.cache_control.immutable = True
+    return response
 
 
 # ==========================================
@@ -124,6 +511,7 @@ def serve_frontend_static(filename):
 # ==========================================
 
 @app.route('/api/auth/register', methods=['POST'])
+@rate_limited(register_limiter)
 def register():
     """用户注册"""
     data = request.json
@@ -168,6 +556,7 @@ def register():
     }), 201
 
 @app.route('/api/auth/login', methods=['POST'])
+@rate_limited(login_limiter)
 def login():
     """用户登录"""
     data = request.json
@@ -273,20 +662,75 @@ def admin_login():
 # API: 评论系统
 # ==========================================
 
+# 各文章首页评论的缓存，评论被发布/批准/拒绝/删除时失效
+comment_page_cache = LRUCache(max_entries=512, ttl=app.config['COMMENTS_CACHE_TTL'])
+
+
+def invalidate_comment_pages(article_path=None):
+    """使指定文章（不传则为全部文章）的首页评论缓存失效"""
+    if article_path is None:
+        comment_page_cache.clear()
+    else:
+        comment_page_cache.delete(article_path)
+
+
 @app.route('/api/comments', methods=['GET'])
 def get_comments():
-    """获取指定文章的评论列表（仅显示已批准的评论）"""
+    """
+    获取指定文章的评论列表（仅显示已批准的评论）
+    按时间倒序分页，使用游标而非偏移量：
+    可选参数: limit - 每页条数
+              before, before_id - 上一页返回的 next_cursor，取更早的评论
+    """
     article_path = request.args.get('article_path')
     if not article_path:
         return jsonify({'error': 'article_path required'}), 400
     
-    # 只返回已批准的评论，按时间倒序排列
-    comments = Comment.query.filter_by(
+    limit = request.args.get('limit', app.config['COMMENTS_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['COMMENTS_MAX_PAGE_SIZE']))
+    before = request.args.get('before')
+    before_id = request.args.get('before_id', type=int)
+    
+    # 默认大小的第一页走缓存
+    cacheable = before is None and limit == app.config['COMMENTS_PAGE_SIZE']
+    if cacheable:
+        cached = comment_page_cache.get(article_path)
+        if cached is not None:
+            return jsonify(cached)
+    
+    # 只返回已批准的评论，按时间倒序排列，作者信息通过 JOIN 一次取回
+    query = Comment.query.options(joinedload(Comment.user)).filter_by(
         article_path=article_path,
         status='approved'
-    ).order_by(Comment.timestamp.desc()).all()
-    
-    return jsonify([c.to_dict() for c in comments])
+    )
+    if before is not None:
+        try:
+            before_time = datetime.fromisoformat(before)
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+        if before_id is None:
+            query = query.filter(Comment.timestamp < before_time)
+        else:
+            query = query.filter(or_(
+                Comment.timestamp < before_time,
+                and_(Comment.timestamp == before_time, Comment.id < before_id)
+            ))
+    comments = query.order_by(Comment.timestamp.desc(), Comment.id.desc()).limit(limit + 1).all()
+    
+    has_more = len(comments) > limit
+    comments = comments[:limit]
+    next_cursor = None
+    if has_more:
+        last = comments[-1]
+        next_cursor = {'before': last.timestamp.isoformat(), 'before_id': last.id}
+    
+    result = {
+        'comments': [c.to_dict() for c in comments],
+        'next_cursor': next_cursor
+    }
+    if cacheable:
+        comment_page_cache.set(article_path, result)
+    return jsonify(result)
 
 @app.route('/api/comments', methods=['POST'])
 @jwt_required()
@@ -307,15 +751,12 @@ def add_comment():
     if not content or not article_path:
         return jsonify({'error': 'Missing required fields'}), 400
 
-    # 频率限制检查
+    # 频率限制检查（内存计数，不再每次 COUNT 查询）
     ip_address = request.remote_addr
-    today_start = datetime.combine(date.today(), datetime.min.time())
-    comment_count = Comment.query.filter(
-        Comment.user_id == user.id,
-        Comment.timestamp >= today_start
-    ).count()
-
-    if comment_count >= 10:
+    if not check_quota(comment_user_quota, user.id).allowed:
+        return jsonify({'error': 'Daily comment limit reached'}), 429
+    if not check_quota(comment_ip_quota, ip_address).allowed:
+        comment_user_quota.release(user.id)
         return jsonify({'error': 'Daily comment limit reached'}), 429
 
     # 决定评论状态
@@ -330,13 +771,93 @@ def add_comment():
         status=status
     )
     db.session.add(new_comment)
-    db.session.commit()
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        comment_user_quota.release(user.id)
+        comment_ip_quota.release(ip_address)
+        raise
+    if status == 'approved':
+        invalidate_comment_pages(article_path)
     
     return jsonify({
         'message': 'Comment submitted' if status == 'pending' else 'Comment published',
         'comment': new_comment.to_dict()
     }), 201
 
+# ==========================================
+# API: 文章索引与检索
+# ==========================================
+
+@app.route('/api/articles', methods=['GET'])
+def get_articles_index():
+    """
+    编译后的文章索引（规范化 slug、按日期排序、分类/标签统计）
+    带强 ETag，浏览器每次重新验证，索引文件未变化时返回 304
+    """
+    body, etag = article_index.compiled()
+    if request.if_none_match.contains_weak(etag.strip('"')):
+        response = app.response_class(status=304)
+    else:
+        response = app.response_class(body, content_type='application/json; charset=utf-8')
+    response.headers['ETag'] = etag
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/articles/<slug>/html', methods=['GET'])
+def get_article_html(slug):
+    """
+    服务端渲染的 Markdown 文章：清洗后的 HTML 和标题大纲
+    ETag 为源文件内容哈希，文章未修改时返回 304
+    """
+    article = next((item for item in article_index.articles() if item['slug'] == slug), None)
+    if article is None:
+        return jsonify({'error': 'Article not found'}), 404
+    if article['type'] != 'md':
+        return jsonify({'error': 'Not a markdown article'}), 400
+    if not article_renderer.available:
+        return jsonify({'error': 'Server-side rendering unavailable'}), 501
+    path = resolve_article_path(frontend_dir, article)
+    if not path or not os.path.exists(path):
+        return jsonify({'error': 'Article file not found'}), 404
+
+    etag = article_renderer.digest(path)[:32]
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+    else:
+        _, result = article_renderer.render(path)
+        response = jsonify({'slug': slug, 'html': result['html'], 'outline': result['outline']})
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/search', methods=['GET'])
+def search_articles():
+    """
+    全文检索文章标题、标签、分类、简介和正文
+    参数: q 检索词（空格分隔，多个词同时命中），page 页码（从 1 开始），per_page 每页条数（最多 50）
+    """
+    query = (request.args.get('q') or '').strip()
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = min(max(request.args.get('per_page', 10, type=int), 1), 50)
+    if not query:
+        return jsonify({'error': 'Query required'}), 400
+
+    started = time.perf_counter()
+    total, results = article_search.search(query, page=page, per_page=per_page)
+    return jsonify({
+        'query': query,
+        'total': total,
+        'page': page,
+        'per_page': per_page,
+        'results': results,
+        'took_ms': round((time.perf_counter() - started) * 1000, 2)
+    }), 200
+
+
 # ==========================================
 # API: 访问统计
 # ==========================================
@@ -344,7 +865,7 @@ def add_comment():
 @app.route('/dash')
 def dashboard():
     """简单的后端管理仪表盘页面"""
-    total_visits = Visit.query.count()
+    total_visits = db.session.query(func.coalesce(func.sum(VisitDailyRollup.count), 0)).scalar()
     recent_visits = Visit.query.order_by(Visit.timestamp.desc()).limit(10).all()
     total_comments = Comment.query.count()
     
@@ -359,24 +880,32 @@ def record_visit():
     """
     记录页面访问
     包含去重逻辑：同一 IP 同一天访问同一路径只记录一次
+    启用写缓冲时只入队并立即返回，由后台线程批量落库
     """
     data = request.json
     path = data.get('path', '/')
     ip_address = request.remote_addr
+    now = datetime.utcnow()
     
-    today_start = datetime.combine(date.today(), datetime.min.time())
-    existing_visit = Visit.query.filter(
-        Visit.ip_address == ip_address,
-        Visit.path == path,
-        Visit.timestamp >= today_start
-    ).first()
-    
-    if existing_visit:
+    # 去重判断由内存索引完成，不再查询 Visit 表
+    if not visit_dedup.add(ip_address, path):
         return jsonify({'status': 'ignored', 'reason': 'already_visited_today'})
 
-    visit = Visit(path=path, ip_address=ip_address)
+    # 缓冲模式下由 _on_visits_flushed 在批量落库成功后计入排行榜
+    if visit_buffer and visit_buffer.submit(path, ip_address, now):
+        return jsonify({'status': 'queued'})
+
+    visit = Visit(path=path, ip_address=ip_address, timestamp=now)
     db.session.add(visit)
-    db.session.commit()
+    VisitDailyRollup.add_visits([{'path': path, 'timestamp': now}])
+    try:
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        visit_dedup.discard(ip_address, path)
+        raise
+    # 落库成功后才计入排行榜，提交失败后重试不会重复计数
+    top_articles.add(path, now.date())
     return jsonify({'status': 'recorded'})
 
 @app.route('/api/stats/summary', methods=['GET'])
@@ -388,11 +917,11 @@ def get_stats_summary():
     """
     path = request.args.get('path')
     
-    query = Visit.query
+    # 总量和每日趋势都从日汇总表读取，开销与天数相关而非访问记录数
+    total_query = db.session.query(func.coalesce(func.sum(VisitDailyRollup.count), 0))
     if path:
-        query = query.filter_by(path=path)
-        
-    total_visits = query.count()
+        total_query = total_query.filter(VisitDailyRollup.path == path)
+    total_visits = total_query.scalar()
     
     # 获取最近 7 天的数据
     end_date = date.today()
@@ -400,18 +929,16 @@ def get_stats_summary():
     
     # 按日期分组统计
     daily_query = db.session.query(
-        func.date(Visit.timestamp).label('date'),
-        func.count(Visit.id).label('count')
+        VisitDailyRollup.date,
+        func.sum(VisitDailyRollup.count).label('count')
     ).filter(
-        Visit.timestamp >= datetime.combine(start_date, datetime.min.time())
+        VisitDailyRollup.date >= start_date
     )
     
     if path:
-        daily_query = daily_query.filter(Visit.path == path)
+        daily_query = daily_query.filter(VisitDailyRollup.path == path)
         
-    daily_stats = daily_query.group_by(
-        func.date(Visit.timestamp)
-    ).all()
+    daily_stats = daily_query.group_by(VisitDailyRollup.date).all()
     
     # 补全缺失日期的通过 0 填充
     stats_dict = {str(day.date): day.count for day in daily_stats}
@@ -432,23 +959,20 @@ def get_stats_summary():
 @app.route('/api/stats/top', methods=['GET'])
 def get_top_articles():
     """
-    获取浏览量最高的文章 (Top 3)
-    只统计 /docs/ 开头的路径
+    获取浏览量最高的文章
+    只统计 /docs/ 开头的路径，结果来自内存排行榜，不扫描 Visit 表
+    可选参数: limit - 返回条数 (默认 3，最多 20)
+              window - 统计窗口: all (默认) / 7d / 30d
     """
-    # 统计 path 出现次数，按次数倒序
-    top_paths = db.session.query(
-        Visit.path,
-        func.count(Visit.id).label('count')
-    ).filter(
-        Visit.path.like('/docs/%')
-    ).group_by(
-        Visit.path
-    ).order_by(
-        func.count(Visit.id).desc()
-    ).limit(3).all()
-    
+    window = request.args.get('window', 'all')
+    if window not in TopArticlesBoard.WINDOWS:
+        return jsonify({'error': 'Invalid window'}), 400
+    limit = request.args.get('limit', 3, type=int)
+    if limit is None or limit < 1:
+        return jsonify({'error': 'Invalid limit'}), 400
+
     result = []
-    for path, count in top_paths:
+    for path, count in top_articles.top(limit, window):
         # 提取 slug: /docs/my-slug -> my-slug
         slug = path.split('/')[-1]
         result.append({
@@ -460,91 +984,89 @@ def get_top_articles():
     return jsonify(result)
 
 
-PROXY_URL_PATTERN = re.compile(r'(src|href|action)=("|\")(.*?)(\2)', re.IGNORECASE)
-CSS_URL_PATTERN = re.compile(r'url\(([^)]+)\)', re.IGNORECASE)
-CSS_IMPORT_PATTERN = re.compile(r'@import\s+(?:url\()?(["\']?[^\s"\')]+["\']?)\)?', re.IGNORECASE)
+upstream_pool = UpstreamPool(
+    max_idle_per_host=app.config['PROXY_MAX_IDLE_PER_HOST'],
+    idle_timeout=app.config['PROXY_IDLE_TIMEOUT'],
+    timeout=app.config['PROXY_TIMEOUT'],
+    user_agent='AlphaDocsProxy/1.0',
+    max_active_per_host=app.config['PROXY_MAX_ACTIVE_PER_HOST'],
+    max_waiting_per_host=app.config['PROXY_MAX_WAITING_PER_HOST'],
+    queue_timeout=app.config['PROXY_QUEUE_TIMEOUT']
+)
 
+# 合并同一目标的并发 GET 请求
+proxy_flights = SingleFlight()
 
-def build_proxy_url(target_url: str) -> str:
-    return f"/api/ifm-proxy?target={quote(target_url, safe='')}"
 
+proxy_cache = ProxyCache(
+    max_bytes=app.config['PROXY_CACHE_MAX_BYTES'],
+    default_ttl=app.config['PROXY_CACHE_DEFAULT_TTL'],
+    spill_dir=os.path.join(basedir, 'data', 'proxy-cache') if app.config['PROXY_CACHE_SPILL'] else None,
+    max_spill_bytes=app.config['PROXY_CACHE_SPILL_MAX_BYTES']
+)
 
-def rewrite_url_for_proxy(raw_url: str, base_url: str) -> str:
-    if not raw_url:
-        return raw_url
 
-    trimmed = raw_url.strip()
-    lower = trimmed.lower()
+def rewrite_proxied_css(remote, target):
+    """读取 CSS 响应并重写其中的 url() / @import"""
+    content = remote.read()
+    charset = remote.headers.get_content_charset() or 'utf-8'
+    text = content.decode(charset, errors='replace')
+    return rewrite_css_for_proxy(text, target).encode('utf-8')
 
-    if trimmed.startswith('#') or lower.startswith('javascript:') or lower.startswith('data:'):
-        return trimmed
-
-    if trimmed.startswith('/api/ifm-proxy?target='):
-        return trimmed
-
-    if trimmed.startswith('//'):
-        base_scheme = urlparse(base_url).scheme or 'http'
-        absolute = f"{base_scheme}:{trimmed}"
-    elif lower.startswith('http://') or lower.startswith('https://'):
-        absolute = trimmed
-    else:
-        absolute = urljoin(base_url, trimmed)
-
-    if absolute.lower().startswith('https://'):
-        return absolute
-
-    return build_proxy_url(absolute)
-
-
-def rewrite_html_for_proxy(html_text: str, base_url: str) -> str:
-    def replace_attr(match):
-        attr = match.group(1)
-        quote_char = match.group(2)
-        value = match.group(3)
-        new_value = rewrite_url_for_proxy(value, base_url)
-        return f"{attr}={quote_char}{new_value}{quote_char}"
-
-    return PROXY_URL_PATTERN.sub(replace_attr, html_text)
-
-
-def _wrap_css_url(new_url: str, original_token: str) -> str:
-    stripped = original_token.strip()
-    if stripped.startswith(('"', "'")) and stripped[-1:] == stripped[:1]:
-        quote_char = stripped[0]
-        return f"{quote_char}{new_url}{quote_char}"
-    return new_url
 
+def stream_rewritten_html(remote, target, on_complete=None, max_collect=0):
+    """
+    边读取上游 HTML 边重写并输出（生成器）
+    on_complete(body) 在完整输出后调用，用于写入缓存；页面超过 max_collect 字节时不再收集
+    """
+    try:
+        decoder = codecs.getincrementaldecoder(remote.headers.get_content_charset() or 'utf-8')(errors='replace')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    rewriter = StreamingHTMLRewriter(target)
+    collected = [] if on_complete else None
+    collected_size = 0
+
+    for chunk in remote.iter_chunks(app.config['PROXY_CHUNK_SIZE']):
+        text = rewriter.feed(decoder.decode(chunk))
+        if not text:
+            continue
+        data = text.encode('utf-8')
+        if collected is not None:
+            collected_size += len(data)
+            if collected_size <= max_collect:
+                collected.append(data)
+            else:
+                collected = None
+        yield data
 
-def rewrite_css_for_proxy(css_text: str, base_url: str) -> str:
-    def replace_url(match):
-        token = match.group(1)
-        cleaned = token.strip().strip('"\'')
-        lowered = cleaned.lower()
-        if not cleaned or lowered.startswith('data:') or lowered.startswith('javascript:'):
-            return match.group(0)
-        new_value = rewrite_url_for_proxy(cleaned, base_url)
-        wrapped = _wrap_css_url(new_value, token)
-        return f"url({wrapped})"
+    text = rewriter.feed(decoder.decode(b'', final=True)) + rewriter.close()
+    data = text.encode('utf-8')
+    if collected is not None and collected_size + len(data) <= max_collect:
+        collected.append(data)
+        on_complete(b''.join(collected))
+    if data:
+        yield data
 
-    def replace_import(match):
-        token = match.group(1)
-        stripped = token.strip()
-        cleaned = stripped.strip('"\'')
-        lowered = cleaned.lower()
-        if not cleaned or lowered.startswith('data:') or lowered.startswith('javascript:'):
-            return match.group(0)
-        new_value = rewrite_url_for_proxy(cleaned, base_url)
-        wrapped = _wrap_css_url(new_value, stripped)
-        return f"@import url({wrapped})"
 
-    css_text = CSS_URL_PATTERN.sub(replace_url, css_text)
-    css_text = CSS_IMPORT_PATTERN.sub(replace_import, css_text)
-    return css_text
+def _proxy_response(body, content_type, target, cache_status=None):
+    response = app.response_class(body, content_type=content_type)
+    response.headers['Cache-Control'] = 'public, max-age=60'
+    response.headers['X-IFM-Proxy'] = '1'
+    response.headers['X-Content-Source'] = target
+    if cache_status:
+        response.headers['X-Proxy-Cache'] = cache_status
+    return response
 
 
 @app.route('/api/ifm-proxy', methods=['GET', 'POST'])
 def ifm_proxy():
-    """将 http/https 资源通过服务器代理，并重写其中的 http 引用，避免 HTTPS Mixed-Content。"""
+    """
+    将 http/https 资源通过服务器代理，并重写其中的 http 引用，避免 HTTPS Mixed-Content。
+    HTML 边读边重写并流式输出，CSS 整体重写，两者的重写结果按目标 URL 缓存（仅 GET）；
+    其他类型（图片、脚本、字体等）分块流式转发，不在内存中缓存整个响应体。
+    同一目标的并发 GET 只访问一次上游，其余请求等待并共享重写结果（X-Proxy-Cache: COALESCED）。
+    """
     target = request.args.get('target')
     if not target:
         return jsonify({'error': 'target_required'}), 400
@@ -553,53 +1075,110 @@ def ifm_proxy():
     if parsed.scheme not in ('http', 'https'):
         return jsonify({'error': 'invalid_scheme'}), 400
 
+    method = request.method.upper()
+    cached = proxy_cache.lookup(target) if method == 'GET' else None
+    if cached is not None and proxy_cache.is_fresh(cached):
+        proxy_cache.record('hits')
+        return _proxy_response(cached['body'], cached['content_type'], target, 'HIT')
+
+    flight = None
+    if method == 'GET':
+        flight, is_leader = proxy_flights.begin(target)
+        if not is_leader:
+            shared = flight.wait(app.config['PROXY_COALESCE_WAIT'])
+            if shared is not None:
+                if 'error' in shared:
+                    return jsonify(shared['error']), shared['status']
+                return _proxy_response(shared['body'], shared['content_type'], target, 'COALESCED')
+            # leader 的结果无法共享（非 HTML/CSS、页面过大或等待超时），自行请求
+            flight = None
+    share = flight.finish if flight else (lambda result=None: None)
+
     try:
-        method = request.method.upper()
         body = request.get_data() if method == 'POST' else None
-        headers = {'User-Agent': 'AlphaDocsProxy/1.0'}
+        headers = {}
         if method == 'POST' and request.content_type:
             headers['Content-Type'] = request.content_type
-
-        req = Request(target, data=body, headers=headers, method=method)
-        with urlopen(req, timeout=8) as remote:
-            content = remote.read()
-            content_type = remote.headers.get('Content-Type', 'text/html; charset=utf-8')
-            content_type_lower = content_type.lower()
-
-            if 'text/html' in content_type_lower:
-                charset = remote.headers.get_content_charset() or 'utf-8'
-                text = content.decode(charset, errors='replace')
-                escaped_target = html.escape(target, quote=True)
-                base_tag = f'<base href="{escaped_target}">' if target else ''
-                lower_text = text.lower()
-                if '<base' not in lower_text:
-                    head_index = lower_text.find('<head')
-                    if head_index != -1:
-                        head_close = lower_text.find('>', head_index)
-                        if head_close != -1:
-                            text = text[:head_close + 1] + base_tag + text[head_close + 1:]
-                        else:
-                            text = base_tag + text
-                    else:
-                        text = base_tag + text
-                text = rewrite_html_for_proxy(text, target)
-                content = text.encode('utf-8')
-                content_type = 'text/html; charset=utf-8'
-            elif 'text/css' in content_type_lower:
-                charset = remote.headers.get_content_charset() or 'utf-8'
-                text = content.decode(charset, errors='replace')
-                text = rewrite_css_for_proxy(text, target)
-                content = text.encode('utf-8')
-                content_type = 'text/css; charset=utf-8'
-
-            response = app.response_class(content, content_type=content_type)
-            response.headers['Cache-Control'] = 'public, max-age=60'
-            response.headers['X-IFM-Proxy'] = '1'
-            response.headers['X-Content-Source'] = target
+        if cached is not None:
+            headers.update(proxy_cache.conditional_headers(cached))
+
+        remote = upstream_pool.request(method, target, body=body, headers=headers)
+
+        if remote.status == 304 and cached is not None:
+            remote.read()
+            cached = proxy_cache.refresh(target, cached, remote.headers)
+            proxy_cache.record('revalidated')
+            share({'body': cached['body'], 'content_type': cached['content_type']})
+            return _proxy_response(cached['body'], cached['content_type'], target, 'REVALIDATED')
+
+        content_type_lower = remote.headers.get('Content-Type', 'text/html').lower()
+        cache_status = None
+        if method == 'GET':
+            proxy_cache.record('misses')
+            cache_status = 'MISS'
+
+        if 'text/html' in content_type_lower:
+            content_type = 'text/html; charset=utf-8'
+            store = None
+            if method == 'GET':
+                upstream_headers = remote.headers
+
+                def store(content):
+                    proxy_cache.store(target, content, content_type, upstream_headers)
+                    share({'body': content, 'content_type': content_type})
+
+            body_iter = stream_rewritten_html(remote, target, store, proxy_cache.max_entry_bytes)
+            response = _proxy_response(body_iter, content_type, target, cache_status)
+            # 页面未完整输出（浏览器断开或页面过大）时让等待者自行请求
+            response.call_on_close(share)
             return response
+
+        if 'text/css' in content_type_lower:
+            content = rewrite_proxied_css(remote, target)
+            content_type = 'text/css; charset=utf-8'
+            if method == 'GET':
+                proxy_cache.store(target, content, content_type, remote.headers)
+            share({'body': content, 'content_type': content_type})
+            return _proxy_response(content, content_type, target, cache_status)
+
+        share(None)
+        response = _proxy_response(
+            remote.iter_chunks(app.config['PROXY_CHUNK_SIZE']),
+            remote.headers.get('Content-Type', 'application/octet-stream'),
+            target
+        )
+        response.direct_passthrough = True
+        for name in ('Content-Length', 'Content-Encoding'):
+            if remote.headers.get(name):
+                response.headers[name] = remote.headers[name]
+        return response
+    except UpstreamBusy as exc:
+        share({'error': {'error': 'upstream_busy', 'detail': str(exc)}, 'status': 503})
+        response = jsonify({'error': 'upstream_busy', 'detail': str(exc)})
+        response.headers['Retry-After'] = '1'
+        return response, 503
     except Exception as exc:
+        share({'error': {'error': 'proxy_failed', 'detail': str(exc)}, 'status': 502})
         return jsonify({'error': 'proxy_failed', 'detail': str(exc)}), 502
 
+
+@app.route('/api/admin/proxy-cache', methods=['GET'])
+@admin_required
+def get_proxy_cache_stats():
+    """获取页面代理缓存的命中统计，以及上游并发和请求合并情况"""
+    stats = proxy_cache.stats()
+    stats['upstream'] = upstream_pool.stats()
+    stats['coalescing'] = proxy_flights.stats()
+    return jsonify(stats), 200
+
+
+@app.route('/api/admin/proxy-cache', methods=['DELETE'])
+@admin_required
+def clear_proxy_cache():
+    """清空页面代理缓存"""
+    proxy_cache.clear()
+    return jsonify({'message': 'Proxy cache cleared'}), 200
+
 # ==========================================
 # API: 管理员后台
 # ==========================================
@@ -676,13 +1255,16 @@ def delete_user(user_id):
     
     db.session.delete(user)
     db.session.commit()
+    invalidate_comment_pages()
     return jsonify({'message': 'User deleted'}), 200
 
 @app.route('/api/admin/comments/pending', methods=['GET'])
 @admin_required
 def get_pending_comments():
     """获取待审核的评论"""
-    comments = Comment.query.filter_by(status='pending').order_by(Comment.timestamp.desc()).all()
+    comments = Comment.query.options(joinedload(Comment.user)).filter_by(
+        status='pending'
+    ).order_by(Comment.timestamp.desc()).all()
     return jsonify([c.to_dict() for c in comments]), 200
 
 @app.route('/api/admin/comments/<int:comment_id>/approve', methods=['POST'])
@@ -700,6 +1282,7 @@ def approve_comment(comment_id):
     comment.reviewed_by = None if identity == 'admin' else identity
     comment.reviewed_at = datetime.utcnow()
     db.session.commit()
+    invalidate_comment_pages(comment.article_path)
     
     return jsonify({'message': 'Comment approved', 'comment': comment.to_dict()}), 200
 
@@ -717,6 +1300,7 @@ def reject_comment(comment_id):
     comment.reviewed_by = None if identity == 'admin' else identity
     comment.reviewed_at = datetime.utcnow()
     db.session.commit()
+    invalidate_comment_pages(comment.article_path)
     
     return jsonify({'message': 'Comment rejected', 'comment': comment.to_dict()}), 200
 
@@ -729,10 +1313,18 @@ def delete_comment(comment_id):
     if not comment:
         return jsonify({'error': 'Comment not found'}), 404
     
+    article_path = comment.article_path
     db.session.delete(comment)
     db.session.commit()
+    invalidate_comment_pages(article_path)
     return jsonify({'message': 'Comment deleted'}), 200
 
+@app.route('/api/admin/startup', methods=['GET'])
+@admin_required
+def get_startup_stats():
+    """获取当前进程的启动耗时统计"""
+    return jsonify(STARTUP_STATS), 200
+
 @app.route('/api/admin/config', methods=['GET'])
 @admin_required
 def get_config():
@@ -750,28 +1342,25 @@ def get_config():
 @app.route('/api/admin/config', methods=['PUT'])
 @admin_required
 def update_config():
-    """更新系统配置"""
+    """更新系统配置（所有变更在一个事务中提交，未变化的键不会写入）"""
     data = request.json
+    updates = {}
     
-    if 'auto_approve_users' in data:
-        SystemConfig.set('auto_approve_users', 'true' if data['auto_approve_users'] else 'false')
-    
-    if 'auto_approve_comments' in data:
-        SystemConfig.set('auto_approve_comments', 'true' if data['auto_approve_comments'] else 'false')
+    for key in ('auto_approve_users', 'auto_approve_comments', 'ai_enabled'):
+        if key in data:
+            updates[key] = 'true' if data[key] else 'false'
     
     # AI 配置
-    if 'ai_enabled' in data:
-        SystemConfig.set('ai_enabled', 'true' if data['ai_enabled'] else 'false')
-    if 'ai_api_url' in data:
-        SystemConfig.set('ai_api_url', data['ai_api_url'])
-    if 'ai_api_key' in data:
-        SystemConfig.set('ai_api_key', data['ai_api_key'])
-    if 'ai_model' in data:
-        SystemConfig.set('ai_model', data['ai_model'])
-    if 'ai_system_prompt' in data:
-        SystemConfig.set('ai_system_prompt', data['ai_system_prompt'])
+    for key in ('ai_api_url', 'ai_api_key', 'ai_model', 'ai_system_prompt'):
+        if key in data:
+            updates[key] = data[key]
+    
+    changed = SystemConfig.set_many(updates)
+    # 模型或系统提示词变化后，旧回答不再适用
+    if 'ai_model' in changed or 'ai_system_prompt' in changed:
+        ai_response_cache.clear()
     
-    return jsonify({'message': 'Config updated'}), 200
+    return jsonify({'message': 'Config updated', 'changed': sorted(changed)}), 200
 
 
 # ==========================================
@@ -786,62 +1375,107 @@ def get_ai_public_config():
     }), 200
 
 
-@app.route('/api/ai/chat', methods=['POST'])
-def ai_chat_proxy():
-    """AI 聊天代理接口"""
-    # 检查是否启用
+ai_response_cache = AIResponseCache(
+    max_bytes=app.config['AI_CACHE_MAX_BYTES'],
+    ttl=app.config['AI_CACHE_TTL'],
+    persist=app.config['AI_CACHE_PERSIST']
+)
+
+# AI 流式对话使用独立的连接池，响应逐行转发；上游读取是阻塞 I/O，
+# 每个进行中的对话在整个回答期间占用一个 worker 线程，
+# 可同时服务的对话数取决于服务器的线程数，并受 AI_MAX_CONCURRENT 限制
+ai_upstream_pool = UpstreamPool(
+    max_idle_per_host=4,
+    timeout=app.config['AI_TIMEOUT'],
+    max_active_per_host=app.config['AI_MAX_CONCURRENT'],
+    max_waiting_per_host=0,
+    queue_timeout=0
+)
+
+
+def _prepare_ai_chat(data):
+    """
+    校验 AI 配置和请求参数，构建上游请求
+    返回 (request, None) 或 (None, 错误响应)；request 含 api_url / api_key / payload / cache_key
+    """
     if SystemConfig.get('ai_enabled') != 'true':
-        return jsonify({'error': 'AI assistant is disabled'}), 403
-    
+        return None, (jsonify({'error': 'AI assistant is disabled'}), 403)
+
     api_url = SystemConfig.get('ai_api_url')
     api_key = SystemConfig.get('ai_api_key')
     model = SystemConfig.get('ai_model') or 'glm-4.5-flash'
     system_prompt = SystemConfig.get('ai_system_prompt') or '你是一个智能文档助手。'
-    
+
     if not api_url or not api_key:
-        return jsonify({'error': 'AI not configured'}), 503
-    
-    data = request.json
+        return None, (jsonify({'error': 'AI not configured'}), 503)
+
     user_message = data.get('message', '')
-    context = data.get('context', [])
-    
+
     if not user_message:
-        return jsonify({'error': 'Message required'}), 400
-    
-    # 构建完整的 system prompt，包含文档上下文
+        return None, (jsonify({'error': 'Message required'}), 400)
+
+    # 构建完整的 system prompt，只附带与问题最相关的文档（由服务端索引挑选，忽略客户端传来的 context）
+    context = article_index.context_block(user_message, app.config['AI_CONTEXT_TOP_K'])
     full_system_prompt = system_prompt
     if context:
-        full_system_prompt += f"\n\n文档列表: {json.dumps(context, ensure_ascii=False)}"
+        full_system_prompt += f"\n\n相关文档（标题 | 链接 | 分类 | 标签 | 简介）:\n{context}"
         full_system_prompt += "\n\n请注意：如果用户询问某篇文档，请提供文档的标题和链接（链接格式为 /docs/{slug}）。"
-    
-    try:
-        import urllib.request
-        import json as json_lib
-        
-        payload = json_lib.dumps({
+
+    return {
+        'api_url': api_url,
+        'api_key': api_key,
+        'cache_key': make_ai_cache_key(model, system_prompt, context, user_message),
+        'payload': {
             'model': model,
             'messages': [
                 {'role': 'system', 'content': full_system_prompt},
                 {'role': 'user', 'content': user_message}
             ]
-        }).encode('utf-8')
+        }
+    }, None
+
+
+@app.route('/api/ai/chat', methods=['POST'])
+@rate_limited(ai_chat_limiter)
+def ai_chat_proxy():
+    """AI 聊天代理接口"""
+    ai_request, error = _prepare_ai_chat(request.json or {})
+    if error:
+        return error
+
+    use_cache = app.config['AI_CACHE_TTL'] > 0
+    cached = ai_response_cache.get(ai_request['cache_key']) if use_cache else None
+    if cached is not None:
+        response = jsonify({'content': cached})
+        response.headers['X-AI-Cache'] = 'HIT'
+        return response, 200
+    
+    try:
+        import urllib.request
+        import json as json_lib
+        
+        payload = json_lib.dumps(ai_request['payload']).encode('utf-8')
         
         req = urllib.request.Request(
-            api_url,
+            ai_request['api_url'],
             data=payload,
             headers={
                 'Content-Type': 'application/json',
-                'Authorization': f'Bearer {api_key}'
+                'Authorization': f"Bearer {ai_request['api_key']}"
             },
             method='POST'
         )
         
+        started = time.perf_counter()
         with urllib.request.urlopen(req, timeout=30) as resp:
             result = json_lib.loads(resp.read().decode('utf-8'))
             
             if result.get('choices') and len(result['choices']) > 0:
+                content = result['choices'][0]['message']['content']
+                if use_cache and content:
+                    ai_response_cache.set(ai_request['cache_key'], content, (time.perf_counter() - started) * 1000)
                 return jsonify({
-                    'content': result['choices'][0]['message']['content']
+                    'content': content
                 }), 200
             else:
                 return jsonify({'error': 'Empty response from AI'}), 502
@@ -851,6 +1485,123 @@ def ai_chat_proxy():
     except Exception as e:
         return jsonify({'error': f'AI request failed: {str(e)}'}), 502
 
+
+def _sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode('utf-8')
+
+
+def relay_ai_stream(remote, on_complete=None):
+    """
+    把 OpenAI 兼容接口的流式响应转换为发给浏览器的 SSE（生成器）
+    事件: token {content} / done {} / error {error}
+    上游忽略 stream 参数直接返回完整 JSON 时，整段内容作为一个 token 发送
+    on_complete(content) 在完整回答输出后调用，用于写入缓存
+    """
+    parts = []
+    try:
+        if 'text/event-stream' not in remote.headers.get('Content-Type', '').lower():
+            result = json.loads(remote.read().decode('utf-8'))
+            choices = result.get('choices') or []
+            if choices:
+                content = choices[0]['message']['content']
+                yield _sse_event('token', {'content': content})
+                yield _sse_event('done', {})
+                if on_complete and content:
+                    on_complete(content)
+            else:
+                yield _sse_event('error', {'error': 'Empty response from AI'})
+            return
+
+        for line in remote.iter_lines():
+            line = line.strip()
+            if not line.startswith(b'data:'):
+                continue
+            data = line[5:].strip()
+            if data == b'[DONE]':
+                break
+            try:
+                chunk = json.loads(data)
+            except ValueError:
+                continue
+            choices = chunk.get('choices') or []
+            content = (choices[0].get('delta') or {}).get('content') if choices else None
+            if content:
+                parts.append(content)
+                yield _sse_event('token', {'content': content})
+        yield _sse_event('done', {})
+        if on_complete and parts:
+            on_complete(''.join(parts))
+    except Exception as e:
+        yield _sse_event('error', {'error': f'AI request failed: {str(e)}'})
+    finally:
+        remote.close()
+
+
+@app.route('/api/ai/chat/stream', methods=['POST'])
+@rate_limited(ai_chat_limiter)
+def ai_chat_stream():
+    """AI 聊天代理接口（流式），以 SSE 逐段返回模型输出"""
+    ai_request, error = _prepare_ai_chat(request.json or {})
+    if error:
+        return error
+
+    cache_key = ai_request['cache_key']
+    use_cache = app.config['AI_CACHE_TTL'] > 0
+    cached = ai_response_cache.get(cache_key) if use_cache else None
+    if cached is not None:
+        body = _sse_event('token', {'content': cached}) + _sse_event('done', {})
+        response = app.response_class(body, content_type='text/event-stream; charset=utf-8')
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['X-AI-Cache'] = 'HIT'
+        return response
+
+    payload = dict(ai_request['payload'], stream=True)
+    started = time.perf_counter()
+    try:
+        remote = ai_upstream_pool.request(
+            'POST',
+            ai_request['api_url'],
+            body=json.dumps(payload).encode('utf-8'),
+            headers={
+                'Content-Type': 'application/json',
+                'Accept': 'text/event-stream',
+                'Authorization': f"Bearer {ai_request['api_key']}"
+            }
+        )
+    except UpstreamBusy:
+        return jsonify({'error': 'Too many concurrent AI chats'}), 503
+    except UpstreamError as e:
+        return jsonify({'error': f'AI API error: {str(e)}'}), 502
+    except Exception as e:
+        return jsonify({'error': f'AI request failed: {str(e)}'}), 502
+
+    on_complete = None
+    if use_cache:
+        # 生成器在请求上下文之外执行，持久化写库需要自己的 app_context
+        def on_complete(content):
+            with app.app_context():
+                ai_response_cache.set(cache_key, content, (time.perf_counter() - started) * 1000)
+
+    response = app.response_class(relay_ai_stream(remote, on_complete), content_type='text/event-stream; charset=utf-8')
+    response.headers['Cache-Control'] = 'no-cache'
+    # 关闭反向代理（如 Nginx）的响应缓冲，保证逐段送达
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@app.route('/api/admin/ai-cache', methods=['GET'])
+@admin_required
+def get_ai_cache_stats():
+    """获取 AI 回答缓存的命中率和节省的上游耗时"""
+    return jsonify(ai_response_cache.stats()), 200
+
+
+@app.route('/api/admin/ai-cache', methods=['DELETE'])
+@admin_required
+def clear_ai_cache():
+    """清空 AI 回答缓存"""
+    ai_response_cache.clear()
+    return jsonify({'message': 'AI cache cleared'}), 200
+
 # ==========================================
 # SPA 路由捕获
 # ==========================================
@@ -877,7 +1628,10 @@ def catch_all(path):
     
     # 确定 CDN 基础路径注入到模板中
     final_cdn_url = CDN_URL if CDN_URL else '/frontend'
-    return render_template('index.html', cdn_url=final_cdn_url)
+    if app.config['SHELL_INLINE']:
+        return shell_renderer.render(final_cdn_url)
+    return render_template('index.html', cdn_url=final_cdn_url,
+                           asset_manifest_key=asset_manifest.manifest_key('index') or '/index')
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', debug=True, port=5000)
@@ -0,0 +1,213 @@
+"""
+文章全文检索
+把 md-map.json 中的元数据和 frontend/articles/ 下的 Markdown/HTML 正文写入 SQLite FTS5 表 article_fts，
+按来源签名增量重建；查询结果按 bm25 排序并返回高亮摘要。
+"""
+import hashlib
+import html
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+
+from sqlalchemy import text
+
+from articles import resolve_article_path
+from models import db, ArticleSearchDoc
+
+# 参与检索的列及其 bm25 权重（slug 列不建索引，权重占位为 0）
+COLUMN_WEIGHTS = (0.0, 3.0, 2.5, 1.5, 1.0, 1.0)
+SEARCH_COLUMNS = ('title', 'tags', 'category', 'description', 'body')
+
+# trigram 分词至少需要 3 个字符，更短的检索词改用 instr 逐行匹配
+MIN_MATCH_LENGTH = 3
+
+# 摘要中高亮的起止标记，转义 HTML 后再替换为 <mark>
+MARK_START, MARK_END = '\x01', '\x02'
+SNIPPET_CHARS = 32
+# snippet() 的窗口按分词计算，trigram 下约等于字符数
+SNIPPET_TOKENS = 48
+
+HTML_DROP_PATTERN = re.compile(r'<(script|style)\b.*?</\1\s*>|<!--.*?-->', re.IGNORECASE | re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r'<[^>]+>')
+MARKDOWN_SYNTAX_PATTERN = re.compile(r'```\w*|[#>*_`~]+|!?\[|\]\([^)]*\)')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+
+def extract_text(path):
+    """读取文章正文并去掉 HTML 标签 / Markdown 标记，返回纯文本"""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        content = f.read()
+    if path.endswith('.html'):
+        content = HTML_DROP_PATTERN.sub(' ', content)
+        content = html.unescape(HTML_TAG_PATTERN.sub(' ', content))
+    else:
+        content = MARKDOWN_SYNTAX_PATTERN.sub(' ', content)
+    return WHITESPACE_PATTERN.sub(' ', content).strip()
+
+
+def _highlight(snippet):
+    escaped = html.escape(snippet)
+    return escaped.replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+class ArticleSearch:
+    """
+    文章全文检索
+    article_index: ArticleIndex 实例，提供文章元数据
+    articles_root: 正文文件所在目录（md-map.json 中的 path 相对于该目录）
+    reindex_interval: 两次检查文件变化之间的最短间隔（秒）
+    """
+
+    def __init__(self, article_index, articles_root, reindex_interval=5):
+        self.article_index = article_index
+        self.articles_root = articles_root
+        self.reindex_interval = reindex_interval
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def sync(self, force=False):
+        """
+        增量重建索引（需在 app_context 中调用）
+        只重新写入签名变化的文章并删除已移除的文章，返回 {'indexed': n, 'removed': n}
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reindex_interval:
+            return {'indexed': 0, 'removed': 0}
+        with self._lock:
+            if not force and now - self._checked_at < self.reindex_interval:
+                return {'indexed': 0, 'removed': 0}
+            self._checked_at = now
+            return self._sync()
+
+    def search(self, query, page=1, per_page=10):
+        """
+        检索文章，返回 (总数, 结果列表)
+        多个检索词之间为 AND 关系；结果包含文章元数据、高亮摘要和得分
+        """
+        self.sync()
+        terms = [term.lower() for term in query.split() if term.strip('"')]
+        if not terms:
+            return 0, []
+        long_terms = [term for term in terms if len(term) >= MIN_MATCH_LENGTH]
+        short_terms = [term for term in terms if len(term) < MIN_MATCH_LENGTH]
+
+        params = {}
+        conditions = []
+        if long_terms:
+            params['match'] = ' AND '.join('"{}"'.format(term.replace('"', '""')) for term in long_terms)
+            conditions.append('article_fts MATCH :match')
+        score_parts = []
+        for i, term in enumerate(short_terms):
+            params[f'term{i}'] = term
+            conditions.append(
+                '(' + ' OR '.join(f'instr(lower({column}), :term{i})' for column in SEARCH_COLUMNS) + ')'
+            )
+            # 短词没有 bm25，按命中的列加权计分（越小越靠前，与 bm25 一致）
+            score_parts.extend(
+                f'-(instr(lower({column}), :term{i}) > 0) * {weight}'
+                for column, weight in zip(SEARCH_COLUMNS, COLUMN_WEIGHTS[1:])
+            )
+        if long_terms:
+            score_parts.insert(0, 'bm25(article_fts, {})'.format(', '.join(map(str, COLUMN_WEIGHTS))))
+            snippet = f"snippet(article_fts, -1, '{MARK_START}', '{MARK_END}', '…', {SNIPPET_TOKENS})"
+        else:
+            snippet = 'NULL'
+        where = ' AND '.join(conditions)
+
+        total = db.session.execute(text(f'SELECT count(*) FROM article_fts WHERE {where}'), params).scalar()
+        rows = db.session.execute(text(
+            f'SELECT slug, {snippet} AS snippet, {" + ".join(score_parts)} AS score, body, description '
+            f'FROM article_fts WHERE {where} ORDER BY score, slug LIMIT :limit OFFSET :offset'
+        ), dict(params, limit=per_page, offset=(page - 1) * per_page)).fetchall()
+
+        by_slug = {article['slug']: article for article in self.article_index.articles()}
+        results = []
+        for row in rows:
+            article = by_slug.get(row.slug)
+            if article is None:
+                continue
+            snippet_text = row.snippet or self._short_term_snippet(row.body or row.description or '', short_terms)
+            results.append({
+                'slug': article['slug'],
+                'title': article.get('title'),
+                'category': article.get('category'),
+                'tags': article['tags'],
+                'description': article.get('description'),
+                'date': article.get('date'),
+                'type': article['type'],
+                'snippet': _highlight(snippet_text),
+                'score': round(-row.score, 4),
+            })
+        return total, results
+
+    @staticmethod
+    def _short_term_snippet(content, terms):
+        """为只有短检索词的查询生成摘要：截取第一个命中位置附近的文本"""
+        lower = content.lower()
+        positions = [(lower.find(term), term) for term in terms if lower.find(term) != -1]
+        if not positions:
+            return content[:SNIPPET_CHARS * 2]
+        start, _ = min(positions)
+        begin = max(start - SNIPPET_CHARS, 0)
+        end = min(start + SNIPPET_CHARS * 2, len(content))
+        window = content[begin:end]
+        for term in terms:
+            window = re.sub(re.escape(term), lambda m: MARK_START + m.group(0) + MARK_END, window, flags=re.IGNORECASE)
+        return ('…' if begin else '') + window + ('…' if end < len(content) else '')
+
+    def _signature(self, article):
+        meta = json.dumps(article, ensure_ascii=False, sort_keys=True)
+        body_path = self._body_path(article)
+        stat = ''
+        if body_path:
+            try:
+                st = os.stat(body_path)
+                stat = f'{st.st_size}:{st.st_mtime_ns}'
+            except OSError:
+                pass
+        return hashlib.sha256(f'{meta}\n{stat}'.encode('utf-8')).hexdigest()
+
+    def _body_path(self, article):
+        return resolve_article_path(self.articles_root, article)
+
+    def _sync(self):
+        articles = {article['slug']: article for article in self.article_index.articles()}
+        indexed = {doc.slug: doc.signature for doc in ArticleSearchDoc.query.all()}
+
+        removed = [slug for slug in indexed if slug not in articles]
+        changed = []
+        for slug, article in articles.items():
+            signature = self._signature(article)
+            if indexed.get(slug) != signature:
+                changed.append((article, signature))
+
+        for slug in removed:
+            db.session.execute(text('DELETE FROM article_fts WHERE slug = :slug'), {'slug': slug})
+            ArticleSearchDoc.query.filter_by(slug=slug).delete()
+        for article, signature in changed:
+            body = ''
+            body_path = self._body_path(article)
+            if body_path:
+                try:
+                    body = extract_text(body_path)
+                except OSError:
+                    pass
+            db.session.execute(text('DELETE FROM article_fts WHERE slug = :slug'), {'slug': article['slug']})
+            db.session.execute(text(
+                'INSERT INTO article_fts (slug, title, tags, category, description, body) '
+                'VALUES (:slug, :title, :tags, :category, :description, :body)'
+            ), {
+                'slug': article['slug'],
+                'title': article.get('title') or '',
+                'tags': ' '.join(article['tags']),
+                'category': article.get('category') or '',
+                'description': article.get('description') or '',
+                'body': body,
+            })
+            db.session.merge(ArticleSearchDoc(slug=article['slug'], signature=signature, indexed_at=datetime.utcnow()))
+        if removed or changed:
+            db.session.commit()
+        return {'indexed': len(changed), 'removed': len(removed)}
@@ -0,0 +1,220 @@
+"""
+文章索引
+在服务端读取 frontend/md-map.json（文件修改时间变化后自动重新加载），
+并在标题、标签、分类和简介上建立倒排索引，为 AI 对话挑选与问题最相关的文档。
+"""
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+
+# slug 中允许的字符：字母、数字、汉字、下划线、点和连字符，其余字符替换为连字符
+SLUG_INVALID_PATTERN = re.compile(r'[^\w.\-]+')
+
+# 各字段命中的权重
+FIELD_WEIGHTS = {'title': 3.0, 'tags': 2.5, 'category': 1.5, 'description': 1.0}
+
+# 英文/数字按单词切分，中文按相邻两字切分（单独一个汉字时保留单字）
+WORD_PATTERN = re.compile(r'[a-z0-9]+|[一-鿿]+')
+
+
+def tokenize(text):
+    """把文本切分为检索词列表（可能重复）"""
+    tokens = []
+    for run in WORD_PATTERN.findall((text or '').lower()):
+        if run[0].isascii():
+            tokens.append(run)
+            continue
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def normalize_slug(value):
+    """规范化 slug：去掉首尾空白，空白、斜杠等不安全字符替换为连字符"""
+    return SLUG_INVALID_PATTERN.sub('-', str(value).strip()).strip('-.')
+
+
+def flatten_index(data):
+    """
+    把 md-map.json 转为文章列表，与前端 app.js 的处理保持一致：
+    兼容旧版纯数组格式，新格式按 md / html / ifmhtml 分组并标注 type；缺少 slug 时由路径生成
+    slug 经过规范化，重复的 slug 依次追加 -2、-3 …，跳过不是对象的条目
+    """
+    if isinstance(data, list):
+        groups = [('md', data)]
+    elif isinstance(data, dict):
+        groups = [(kind, data.get(kind) or []) for kind in ('md', 'html', 'ifmhtml')]
+    else:
+        groups = []
+
+    articles = []
+    seen = set()
+    for kind, items in groups:
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            article = dict(item, type=kind)
+            slug = normalize_slug(article.get('slug') or '')
+            if not slug:
+                path = article.get('path') or ''
+                slug = normalize_slug(re.sub(r'\.(md|html)$', '', path).split('/')[-1])
+            slug = slug or f'doc-{len(articles)}'
+            unique, suffix = slug, 2
+            while unique in seen:
+                unique, suffix = f'{slug}-{suffix}', suffix + 1
+            seen.add(unique)
+            article['slug'] = unique
+            tags = article.get('tags') or []
+            article['tags'] = [str(tag).strip() for tag in tags if str(tag).strip()] if isinstance(tags, list) else []
+            articles.append(article)
+    return articles
+
+
+def resolve_article_path(root, article):
+    """文章正文在本地的绝对路径；外部链接或越出 root 的路径返回 None"""
+    path = article.get('path') or ''
+    if '://' in path or not path.endswith(('.md', '.html')):
+        return None
+    root = os.path.normpath(root)
+    full = os.path.normpath(os.path.join(root, path))
+    if not full.startswith(root + os.sep):
+        return None
+    return full
+
+
+def compile_index(articles):
+    """
+    生成 /api/articles 的响应体：文章按日期倒序（同日按标题），并预先统计分类和标签
+    返回 (JSON 字节串, 强 ETag)
+    """
+    ordered = sorted(articles, key=lambda article: article.get('title') or '')
+    ordered.sort(key=lambda article: article.get('date') or '', reverse=True)
+    categories = Counter((article.get('category') or '').strip() or '未分类' for article in ordered)
+    tags = Counter(tag for article in ordered for tag in article['tags'])
+
+    def facet(counter):
+        return [{'name': name, 'count': count}
+                for name, count in sorted(counter.items(), key=lambda item: (-item[1], item[0]))]
+
+    body = json.dumps({
+        'articles': ordered,
+        'categories': facet(categories),
+        'tags': facet(tags),
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return body, '"{}"'.format(hashlib.sha256(body).hexdigest()[:32])
+
+
+class ArticleIndex:
+    """
+    文章索引
+    path: md-map.json 的路径；每次访问时检查文件修改时间，变化后重新加载并重建倒排索引
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._snapshot = ([], [], {})  # (文章列表, 每篇的上下文行, 倒排索引 词 -> {位置: 权重})
+        self._compiled = None  # (快照, 响应体, ETag)
+        self._lock = threading.Lock()
+
+    def articles(self):
+        """当前的文章列表"""
+        return self._current()[0]
+
+    def compiled(self):
+        """返回编译好的文章索引 (响应体, ETag)，同一份快照只编译一次"""
+        snapshot = self._current()
+        compiled = self._compiled
+        if compiled is None or compiled[0] is not snapshot:
+            compiled = (snapshot,) + compile_index(snapshot[0])
+            self._compiled = compiled
+        return compiled[1], compiled[2]
+
+    @property
+    def version(self):
+        """索引文件的修改时间，文件不存在时为 None"""
+        self._current()
+        return self._mtime
+
+    def search(self, query, limit=8):
+        """返回与 query 最相关的文章（按得分从高到低），没有任何命中时返回空列表"""
+        articles, _, postings = self._current()
+        return [articles[position] for position in self._rank(articles, postings, query, limit)]
+
+    def context_block(self, query, limit=8):
+        """
+        为 AI 对话生成精简的文档上下文（每篇一行）
+        没有相关文档时退化为最新的 limit 篇，便于回答“最近更新了什么”之类的问题
+        """
+        articles, lines, postings = self._current()
+        positions = self._rank(articles, postings, query, limit)
+        if not positions:
+            positions = sorted(range(len(articles)),
+                               key=lambda i: articles[i].get('date') or '', reverse=True)[:limit]
+        return '\n'.join(lines[position] for position in positions)
+
+    @staticmethod
+    def _rank(articles, postings, query, limit):
+        scores = defaultdict(float)
+        for token in set(tokenize(query)):
+            entries = postings.get(token)
+            if not entries:
+                continue
+            idf = math.log(1 + len(articles) / len(entries))
+            for position, weight in entries.items():
+                scores[position] += weight * idf
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        return [position for position, _ in ranked]
+
+    def _current(self):
+        """文件有变化时重新加载，返回当前索引快照"""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._reload(mtime)
+        return self._snapshot
+
+    def _reload(self, mtime):
+        articles = []
+        if mtime is not None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    articles = flatten_index(json.load(f))
+            except (OSError, ValueError):
+                return  # 文件正在写入或格式错误时保留旧索引，下次访问再试
+        self._snapshot = self._build(articles)
+        self._mtime = mtime
+
+    @staticmethod
+    def _build(articles):
+        postings = defaultdict(dict)
+        lines = []
+        for position, article in enumerate(articles):
+            fields = {
+                'title': article.get('title'),
+                'tags': ' '.join(article['tags']),
+                'category': article.get('category'),
+                'description': article.get('description'),
+            }
+            for field, text in fields.items():
+                for token in set(tokenize(text)):
+                    entry = postings[token]
+                    entry[position] = entry.get(position, 0) + FIELD_WEIGHTS[field]
+            lines.append(' | '.join([
+                article.get('title') or article['slug'],
+                f"/docs/{article['slug']}",
+                article.get('category') or '未分类',
+                ','.join(article['tags']),
+                article.get('description') or '',
+            ]))
+        return articles, lines, dict(postings)
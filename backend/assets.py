@@ -0,0 +1,290 @@
+"""
+静态资源构建
+把 index-map.json / res-map.json 中列出的文件（以及 load.js 等入口文件）按内容哈希复制到 frontend/dist/，
+生成改写后的资源清单和 dist/asset-manifest.json（原路径 -> 带哈希路径）。
+清单中每组（css / js）连续的本地资源按顺序合并为一个文件并附带 source map，页面只需请求两个文件。
+带哈希的文件内容永不变化，可以用 Cache-Control: immutable 长期缓存；部署时执行 `flask --app app build-assets`。
+"""
+import hashlib
+import json
+import os
+import posixpath
+import re
+import threading
+
+# 参与构建的资源清单（frontend/<name>-map.json），不存在的跳过
+MANIFEST_NAMES = ('index', 'res')
+# 不在资源清单中、由模板直接引用的入口文件
+ENTRY_FILES = ('js/load.js', 'js/admin_entry.js')
+
+DIST_DIR = 'dist'
+HASH_LENGTH = 12
+ASSET_MANIFEST_NAME = 'asset-manifest.json'
+
+# 可以合并的资源组及其扩展名
+BUNDLE_GROUPS = {'css': '.css', 'js': '.js'}
+BASE64_DIGITS = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/'
+
+# 合并时去掉的内容：各文件自带的 source map 注释、CSS 文件开头的 @charset（合并后统一写在最前面）
+SOURCE_MAP_COMMENT_PATTERN = re.compile(r'^\s*(?://[#@] sourceMappingURL=\S*|/\*[#@] sourceMappingURL=[^*]*\*/)\s*$', re.MULTILINE)
+CHARSET_PATTERN = re.compile(r'^\ufeff?@charset\s+["\'][^"\']*["\'];')
+CSS_URL_PATTERN = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+# dist/ 下带内容哈希的文件名：name.<hash>.ext 或资源清单 name.<hash>-map.json
+FINGERPRINT_PATTERN = re.compile(r'^dist/(?:.+/)?[^/]+\.[0-9a-f]{%d}(?:-map)?\.\w+$' % HASH_LENGTH)
+
+
+def is_fingerprinted(path):
+    """path（相对于 frontend）是否为带内容哈希、可永久缓存的构建产物"""
+    return bool(FINGERPRINT_PATTERN.match(path))
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:HASH_LENGTH]
+
+
+def fingerprint_name(path, digest):
+    """css/main.css -> css/main.<hash>.css"""
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{digest}{ext}'
+
+
+def rebase_css_urls(content, source, target):
+    """把 CSS 中相对路径的 url() 改为相对于 target 所在目录（两者都是相对于 frontend 的路径）"""
+    source_dir = os.path.dirname(source)
+    target_dir = os.path.dirname(target)
+
+    def replace(match):
+        quote, url = match.group(1), match.group(2).strip()
+        if url.startswith(('data:', '#', '/')) or '://' in url:
+            return match.group(0)
+        rebased = os.path.relpath(os.path.normpath(os.path.join(source_dir, url)), target_dir or '.')
+        return f'url({quote}{rebased.replace(os.sep, "/")}{quote})'
+
+    return CSS_URL_PATTERN.sub(replace, content)
+
+
+def _vlq(value):
+    """Base64 VLQ 编码（source map v3）"""
+    value = (-value << 1) | 1 if value < 0 else value << 1
+    digits = []
+    while True:
+        digit = value & 31
+        value >>= 5
+        digits.append(BASE64_DIGITS[digit | (32 if value else 0)])
+        if not value:
+            return ''.join(digits)
+
+
+def concat_with_source_map(parts, kind, target):
+    """
+    按顺序合并源文件，parts 为 [(相对于 frontend 的路径, 文本)]，kind 为 'css' 或 'js'
+    返回 (合并后的文本, source map 字典)；映射精确到行，合并不改变各行内容
+    JS 文件之间插入单独一行 ";"，避免上一个文件缺少结尾分号时与下一个文件连成一条语句
+    """
+    lines = []
+    mappings = []
+    charset = None
+    previous = (0, 0)  # 上一个映射段的 (源文件序号, 源行号)，VLQ 按差值编码
+    for index, (path, content) in enumerate(parts):
+        content = SOURCE_MAP_COMMENT_PATTERN.sub('', content)
+        if kind == 'css':
+            match = CHARSET_PATTERN.match(content)
+            if match:
+                charset = charset or match.group(0).lstrip('\ufeff')
+                content = content[match.end():]
+            content = rebase_css_urls(content, path, target)
+        for line_number, line in enumerate(content.split('\n')):
+            lines.append(line)
+            mappings.append('A' + _vlq(index - previous[0]) + _vlq(line_number - previous[1]) + 'A')
+            previous = (index, line_number)
+        if kind == 'js':
+            lines.append(';')
+            mappings.append('')
+    if charset:
+        # @charset 必须位于文件开头，单独占一行，映射整体下移一行
+        lines.insert(0, charset)
+        mappings.insert(0, '')
+    source_map = {
+        'version': 3,
+        'file': os.path.basename(target),
+        'sources': [os.path.relpath(path, os.path.dirname(target)).replace(os.sep, '/') for path, _ in parts],
+        'names': [],
+        'mappings': ';'.join(mappings),
+    }
+    return '\n'.join(lines) + '\n', source_map
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _emit(frontend_dir, target, data):
+    """写入 dist/ 下的哈希文件（内容相同则文件名相同，已存在时跳过），返回 target"""
+    full = os.path.join(frontend_dir, *target.split('/'))
+    if not os.path.exists(full):
+        _write_atomic(full, data)
+    return target
+
+
+def _read(frontend_dir, path):
+    with open(os.path.join(frontend_dir, *path.split('/')), 'rb') as f:
+        return f.read()
+
+
+def build_assets(frontend_dir, prune=False, bundle=True):
+    """
+    构建带哈希的静态资源
+    资源清单中 mode 为 0（相对路径）的条目替换为 dist/ 下的哈希文件，mode 为 1 的外部地址保持不变；
+    bundle 为 True 时 css / js 组中连续的本地条目合并为一个文件（dist/<清单>-<组>.<hash>.<ext> 及同名 .map）；
+    prune 为 True 时删除 dist/ 中不属于本次构建的旧文件（默认保留，已打开的旧页面仍可加载）
+    返回 {'files': {原路径: 哈希路径}, 'bundles': {合并文件: [源文件]}, 'manifests': {名称: 清单键},
+          'missing': [...], 'removed': n}
+    """
+    files = {}
+    bundles = {}
+    missing = []
+    manifests = {}
+    extra = set()  # source map 等不在 files 中的构建产物
+
+    def fingerprint(path):
+        if path in files:
+            return files[path]
+        try:
+            data = _read(frontend_dir, path)
+        except OSError:
+            missing.append(path)
+            return None
+        target_dir = posixpath.dirname(f'{DIST_DIR}/{path}')
+        if path.endswith('.css'):
+            # 复制到 dist/ 后相对路径的 url() 按新位置改写
+            data = rebase_css_urls(data.decode('utf-8'), path, f'{target_dir}/_').encode('utf-8')
+        files[path] = _emit(frontend_dir, f'{DIST_DIR}/' + fingerprint_name(path, content_hash(data)), data)
+        return files[path]
+
+    def concat(name, group, paths):
+        parts = []
+        for path in paths:
+            fingerprint(path)  # 单独的哈希文件仍然生成，供模板直接引用
+            try:
+                parts.append((path, _read(frontend_dir, path).decode('utf-8')))
+            except OSError:
+                pass
+        if not parts:
+            return []
+        if len(parts) == 1:
+            return [[files[parts[0][0]], 0]]
+        # 文件名中的哈希只取决于合并内容，因此 source map 注释（包含文件名）在计算哈希之后追加
+        content, source_map = concat_with_source_map(parts, group, f'{DIST_DIR}/_')
+        digest = content_hash(content.encode('utf-8'))
+        stem = f'{name}-{group}.{digest}'
+        comment = f'/*# sourceMappingURL={stem}.map */' if group == 'css' else f'//# sourceMappingURL={stem}.map'
+        target = _emit(frontend_dir, f'{DIST_DIR}/{stem}{BUNDLE_GROUPS[group]}', (content + comment + '\n').encode('utf-8'))
+        source_map['file'] = posixpath.basename(target)
+        _emit(frontend_dir, f'{DIST_DIR}/{stem}.map', json.dumps(source_map, separators=(',', ':')).encode('utf-8'))
+        extra.add(f'{DIST_DIR}/{stem}.map')
+        bundles[target] = [path for path, _ in parts]
+        return [[target, 0]]
+
+    for name in MANIFEST_NAMES:
+        try:
+            with open(os.path.join(frontend_dir, f'{name}-map.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+        except OSError:
+            continue
+        rewritten = {}
+        for group, entries in manifest.items():
+            rewritten[group] = []
+            if bundle and group in BUNDLE_GROUPS:
+                # 外部地址（mode 1）保持原位置，只合并其间连续的本地条目，执行顺序不变
+                run = []
+                for ref, mode in entries + [[None, 1]]:
+                    if mode == 0:
+                        run.append(ref.lstrip('/'))
+                        continue
+                    if run:
+                        rewritten[group].extend(concat(name, group, run))
+                        run = []
+                    if ref is not None:
+                        rewritten[group].append([ref, mode])
+                continue
+            for ref, mode in entries:
+                if mode == 0:
+                    ref = fingerprint(ref.lstrip('/')) or ref
+                rewritten[group].append([ref, mode])
+        body = json.dumps(rewritten, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        # 清单本身也带哈希：load.js 按 <键>-map.json 加载，键由服务端注入页面
+        key = f'{DIST_DIR}/{name}.{content_hash(body)}'
+        full = os.path.join(frontend_dir, DIST_DIR, f'{name}.{content_hash(body)}-map.json')
+        if not os.path.exists(full):
+            _write_atomic(full, body)
+        manifests[name] = key
+
+    for path in ENTRY_FILES:
+        fingerprint(path)
+
+    _write_atomic(
+        os.path.join(frontend_dir, DIST_DIR, ASSET_MANIFEST_NAME),
+        json.dumps({'files': files, 'bundles': bundles, 'manifests': manifests}, ensure_ascii=False, indent=2).encode('utf-8')
+    )
+
+    removed = 0
+    if prune:
+        keep = set(files.values()) | set(bundles) | extra | {f'{key}-map.json' for key in manifests.values()}
+        keep.add(f'{DIST_DIR}/{ASSET_MANIFEST_NAME}')
+        dist_root = os.path.join(frontend_dir, DIST_DIR)
+        for root, _, names in os.walk(dist_root):
+            for filename in names:
+                relative = os.path.relpath(os.path.join(root, filename), frontend_dir).replace(os.sep, '/')
+                if relative not in keep:
+                    os.remove(os.path.join(root, filename))
+                    removed += 1
+    return {'files': files, 'bundles': bundles, 'manifests': manifests, 'missing': missing, 'removed': removed}
+
+
+class AssetManifest:
+    """
+    构建结果（dist/asset-manifest.json）
+    文件修改时间变化后自动重新加载；尚未构建时所有路径原样返回，前端继续使用未带哈希的资源
+    """
+
+    def __init__(self, frontend_dir):
+        self.path = os.path.join(frontend_dir, DIST_DIR, ASSET_MANIFEST_NAME)
+        self._mtime = None
+        self._data = {'files': {}, 'manifests': {}}
+        self._lock = threading.Lock()
+
+    def asset_path(self, path):
+        """原资源路径对应的带哈希路径，未构建时返回原路径"""
+        return self._current()['files'].get(path, path)
+
+    def manifest_key(self, name='index'):
+        """资源清单的键（load.js 按 <键>-map.json 加载），未构建时返回 None"""
+        return self._current()['manifests'].get(name)
+
+    def _current(self):
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._reload(mtime)
+        return self._data
+
+    def _reload(self, mtime):
+        data = {'files': {}, 'manifests': {}}
+        if mtime is not None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    loaded = json.load(f)
+                data = {'files': loaded.get('files') or {}, 'manifests': loaded.get('manifests') or {}}
+            except (OSError, ValueError):
+                return  # 正在写入时保留旧结果，下次访问再试
+        self._data = data
+        self._mtime = mtime
@@ -0,0 +1,89 @@
+"""
+进程内缓存工具
+"""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """
+    线程安全的 LRU 缓存，支持条目数上限、总字节数上限和过期时间
+    ttl 为 None 时条目不会过期，只会因容量不足被淘汰
+    max_bytes 为 None 时不限制总大小；条目大小由 set() 的 size 参数给出
+    on_evict(key, value) 在条目因容量不足被淘汰时调用（不含过期和主动删除）
+    """
+
+    def __init__(self, max_entries=256, ttl=None, max_bytes=None, on_evict=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.on_evict = on_evict
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._bytes = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                self._remove(key)
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, size=0, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl else None
+        if self.max_bytes is not None and size > self.max_bytes:
+            self.delete(key)
+            return
+        evicted = []
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._data) > self.max_entries or (
+                self.max_bytes is not None and self._bytes > self.max_bytes
+            ):
+                old_key, (old_value, _, old_size) = self._data.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+                evicted.append((old_key, old_value))
+        if self.on_evict:
+            for old_key, old_value in evicted:
+                self.on_evict(old_key, old_value)
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _remove(self, key):
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
@@ -0,0 +1,152 @@
+"""
+响应压缩
+- 预压缩：部署时为 frontend/ 下可压缩的文件生成 .gz（安装了 brotli 时还有 .br）同名文件，
+  静态路由根据 Accept-Encoding 直接返回压缩版本，请求时不再消耗 CPU
+- 动态压缩：超过阈值的 JSON 响应在返回前压缩，结果按内容哈希缓存在有界的 LRU 中
+"""
+import gzip
+import hashlib
+import os
+
+try:
+    import brotli
+except ImportError:  # 可选依赖，未安装时只使用 gzip
+    brotli = None
+
+from cache import LRUCache
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.html', '.js', '.json', '.map', '.md', '.svg', '.txt', '.xml')
+# 预压缩后至少要比原文件小这么多比例才保留
+MIN_SAVING_RATIO = 0.1
+# 编码 -> 同名文件后缀，按优先级排列
+ENCODING_SUFFIXES = (('br', '.br'), ('gzip', '.gz'))
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress(data, encoding, level=6):
+    """按编码压缩字节串；gzip 的 mtime 固定为 0，相同内容得到相同结果"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(level, 11))
+    return gzip.compress(data, compresslevel=min(level, 9), mtime=0)
+
+
+def is_compressible(path):
+    return path.lower().endswith(COMPRESSIBLE_EXTENSIONS)
+
+
+def precompress_tree(root, min_size=1024, skip_dirs=()):
+    """
+    为 root 下可压缩且不小于 min_size 字节的文件生成压缩版本
+    同名压缩文件已存在且不比源文件旧时跳过；压缩收益不足时删除旧的压缩文件
+    返回 {'written': n, 'skipped': n, 'removed': n, 'bytes_in': n, 'bytes_out': n}
+    """
+    result = {'written': 0, 'skipped': 0, 'removed': 0, 'bytes_in': 0, 'bytes_out': 0}
+    suffixes = [(encoding, suffix) for encoding, suffix in ENCODING_SUFFIXES if encoding in available_encodings()]
+    for directory, dirs, names in os.walk(root):
+        dirs[:] = [name for name in dirs if name not in skip_dirs]
+        for name in names:
+            path = os.path.join(directory, name)
+            if not is_compressible(name):
+                continue
+            stat = os.stat(path)
+            if stat.st_size < min_size:
+                continue
+            data = None
+            for encoding, suffix in suffixes:
+                target = path + suffix
+                try:
+                    if os.stat(target).st_mtime_ns >= stat.st_mtime_ns:
+                        result['skipped'] += 1
+                        continue
+                except OSError:
+                    pass
+                if data is None:
+                    with open(path, 'rb') as f:
+                        data = f.read()
+                compressed = compress(data, encoding, level=11 if encoding == 'br' else 9)
+                if len(compressed) > len(data) * (1 - MIN_SAVING_RATIO):
+                    if os.path.exists(target):
+                        os.remove(target)
+                        result['removed'] += 1
+                    continue
+                tmp_path = f'{target}.{os.getpid()}.tmp'
+                with open(tmp_path, 'wb') as f:
+                    f.write(compressed)
+                os.replace(tmp_path, target)
+                result['written'] += 1
+                result['bytes_in'] += len(data)
+                result['bytes_out'] += len(compressed)
+    return result
+
+
+def negotiate(accept_encodings, candidates):
+    """
+    在 candidates（按服务端优先级排列）中选出客户端接受的编码，都不接受时返回 None
+    accept_encodings 为 request.accept_encodings
+    """
+    for encoding in candidates:
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def precompressed_variant(path, accept_encodings):
+    """返回 (压缩文件路径, 编码)；没有可用的（或已过期的）压缩文件时返回 (None, None)"""
+    try:
+        source_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None, None
+    for encoding, suffix in ENCODING_SUFFIXES:
+        if accept_encodings[encoding] <= 0:
+            continue
+        try:
+            if os.stat(path + suffix).st_mtime_ns >= source_mtime:
+                return path + suffix, encoding
+        except OSError:
+            continue
+    return None, None
+
+
+class ResponseCompressor:
+    """
+    动态响应压缩
+    min_bytes: 小于该大小的响应不压缩
+    max_bytes: 压缩结果缓存的总字节数上限（键为 编码 + 原文哈希）
+    """
+
+    def __init__(self, min_bytes=1024, level=6, max_bytes=8 * 1024 * 1024):
+        self.min_bytes = min_bytes
+        self.level = level
+        self._cache = LRUCache(max_entries=4096, max_bytes=max_bytes)
+
+    def apply(self, request, response):
+        """满足条件时就地压缩 response（JSON、200、非流式、未编码、超过阈值），返回 response"""
+        if (response.status_code != 200 or response.mimetype != 'application/json'
+                or response.direct_passthrough or response.is_streamed
+                or 'Content-Encoding' in response.headers):
+            return response
+        response.vary.add('Accept-Encoding')
+        data = response.get_data()
+        if len(data) < self.min_bytes:
+            return response
+        encoding = negotiate(request.accept_encodings, available_encodings())
+        if encoding is None:
+            return response
+        key = f'{encoding}:{hashlib.sha1(data).hexdigest()}'
+        compressed = self._cache.get(key)
+        if compressed is None:
+            compressed = compress(data, encoding, self.level)
+            self._cache.set(key, compressed, size=len(compressed))
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        # 压缩后的表示与原文字节不同，强 ETag 降为弱 ETag
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def stats(self):
+        return self._cache.stats()
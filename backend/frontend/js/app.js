@@ -22,7 +22,8 @@
             articles: null,      // 文章列表缓存
             articleMap: new Map(), // 文章 Slug -> 对象 映射
             tags: new Set(),     // 所有标签集合
-            markdown: new Map()  // 文章内容缓存 (Slug -> Content)
+            markdown: new Map(), // 文章内容缓存 (Slug -> Content)
+            rendered: new Map()  // 服务端渲染结果缓存 (Slug -> { html, outline })
         },
 
         /**
@@ -332,7 +333,10 @@
             
             // 兼容旧版数组格式，统一转换为列表
             let list = [];
-            if (Array.isArray(data)) {
+            if (data && Array.isArray(data.articles)) {
+                // 服务端编译后的索引：slug 已规范化、已按日期排序并标注 type
+                list = data.articles.map(item => ({ ...item }));
+            } else if (Array.isArray(data)) {
                 // 旧格式：纯数组
                 list = data.map(item => ({ ...item, type: 'md' }));
             } else if (data && (data.md || data.html || data.ifmhtml)) {
@@ -395,9 +399,18 @@
         },
 
         /**
-         * 从服务器获取文章索引文件 (md-map.json)
+         * 从服务器获取文章索引
+         * 优先使用 /api/articles（带 ETag，未变化时浏览器只收到 304），接口不可用时回退到 md-map.json
          */
         async fetchArticlesIndex() {
+            try {
+                const response = await fetch('/api/articles', { cache: 'no-cache' });
+                if (response.ok) {
+                    return response.json();
+                }
+            } catch (error) {
+                console.warn('文章索引接口不可用，回退到 md-map.json', error);
+            }
             const base = (CDN_URL || '').replace(/\/$/, '');
             const url = base ? `${base}/md-map.json` : '/md-map.json';
             const response = await fetch(url, { cache: 'no-store' });
@@ -627,7 +640,7 @@
             if (!article) {
                 throw new Error('未找到对应文档');
             }
-            const response = await fetch(this.withCDN(article.path), { cache: 'no-store' });
+            const response = await fetch(this.withCDN(article.path), { cache: 'no-cache' });
             if (!response.ok) {
                 throw new Error('文档内容加载失败');
             }
@@ -641,6 +654,27 @@
             return text;
         },
 
+        /**
+         * 获取服务端渲染的 Markdown 文章 { html, outline }
+         * 由浏览器按 ETag 重新验证；接口不可用（如服务端未安装渲染依赖）时返回 null，由调用方在浏览器端渲染
+         */
+        async getRenderedArticle(slug) {
+            if (!slug) return null;
+            if (this.dataCache.rendered.has(slug)) {
+                return this.dataCache.rendered.get(slug);
+            }
+            try {
+                const response = await fetch(`/api/articles/${encodeURIComponent(slug)}/html`, { cache: 'no-cache' });
+                if (!response.ok) return null;
+                const data = await response.json();
+                this.dataCache.rendered.set(slug, data);
+                return data;
+            } catch (error) {
+                console.warn('获取服务端渲染结果失败', error);
+                return null;
+            }
+        },
+
         /**
          * 处理 CDN 路径
          */
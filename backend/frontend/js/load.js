@@ -28,7 +28,9 @@ async function initApp() {
         await loadMainStructure();
 
         // 无论当前路径如何，始终加载 index-map.json 获取资源清单
-        const manifest = await fetchManifest('/index');
+        // 服务端执行过 build-assets 时注入带哈希的清单（dist/index.<hash>），其中的资源都可永久缓存
+        const manifestKey = typeof ASSET_MANIFEST === 'string' && ASSET_MANIFEST ? ASSET_MANIFEST : '/index';
+        const manifest = window.__ASSET_MANIFEST__ ?? await fetchManifest(manifestKey);
         
         const cssEntries = manifest?.css ?? [];
         const jsEntries = manifest?.js ?? [];
@@ -60,6 +62,11 @@ async function initApp() {
  * 加载主页面结构 (App Shell)
  */
 async function loadMainStructure() {
+    // 服务端已内联页面结构 (SHELL_INLINE) 时无需再请求 main.html
+    if (document.getElementById('app-shell')) {
+        log('使用服务端内联的页面结构');
+        return;
+    }
     try {
         const url = withCDN('main.html');
         const response = await fetch(url);
@@ -115,7 +122,9 @@ async function fetchManifest(key) {
 
     const promise = (async () => {
         const manifestUrl = withCDN(`${key.replace(/^\//, '')}-map.json`);
-        const response = await fetch(manifestUrl, { cache: 'no-store' });
+        // 带哈希的清单内容不会变化，走浏览器缓存；原始清单每次都重新获取
+        const fingerprinted = /^\/?dist\//.test(key);
+        const response = await fetch(manifestUrl, { cache: fingerprinted ? 'default' : 'no-store' });
         if (!response.ok) {
             throw new Error(`加载 ${manifestUrl} 失败: ${response.status}`);
         }
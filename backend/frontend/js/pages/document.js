@@ -322,9 +322,12 @@
                                 fsBtn.addEventListener('click', openModal);
                             }
                         } else {
-                            const content = await spa.getArticleContent(article.slug);
-                            // 根据类型渲染 HTML 或 Markdown
-                            if (article.type === 'html') {
+                            // Markdown 优先使用服务端预渲染的 HTML，不可用时再下载原文在浏览器端解析
+                            const rendered = article.type === 'html' ? null : await spa.getRenderedArticle(article.slug);
+                            const content = rendered ? '' : await spa.getArticleContent(article.slug);
+                            if (rendered) {
+                                target.innerHTML = rendered.html;
+                            } else if (article.type === 'html') {
                                 target.innerHTML = content;
                             } else {
                                 target.innerHTML = window.marked ? window.marked.parse(content) : content;
@@ -517,26 +520,56 @@
                     `;
                 }
 
-                const loadComments = async () => {
+                const renderComment = (c) => `
+                    <div class="comment-item">
+                        <div class="comment-header">
+                            <span class="comment-author">${c.author}</span>
+                            <span class="comment-time">${new Date(c.timestamp).toLocaleString()}</span>
+                        </div>
+                        <div class="comment-content">${c.content}</div>
+                    </div>
+                `;
+
+                // cursor 为空时加载第一页，否则追加更早的评论
+                const loadComments = async (cursor = null) => {
                     if (!commentList) return;
                     try {
-                        const res = await fetch(`/api/comments?article_path=${encodeURIComponent(article.path)}`);
-                        const comments = await res.json();
-                        if (comments.length === 0) {
+                        const params = new URLSearchParams({ article_path: article.path });
+                        if (cursor) {
+                            params.set('before', cursor.before);
+                            params.set('before_id', cursor.before_id);
+                        }
+                        const res = await fetch(`/api/comments?${params.toString()}`);
+                        const page = await res.json();
+                        const comments = page.comments || [];
+                        commentList.querySelector('.load-more-comments')?.remove();
+                        if (!cursor && comments.length === 0) {
                             commentList.innerHTML = '<p class="text-muted">暂无评论，快来抢沙发吧！</p>';
                             return;
                         }
-                        commentList.innerHTML = comments.map(c => `
-                            <div class="comment-item">
-                                <div class="comment-header">
-                                    <span class="comment-author">${c.author}</span>
-                                    <span class="comment-time">${new Date(c.timestamp).toLocaleString()}</span>
-                                </div>
-                                <div class="comment-content">${c.content}</div>
-                            </div>
-                        `).join('');
+                        const html = comments.map(renderComment).join('');
+                        if (cursor) {
+                            commentList.insertAdjacentHTML('beforeend', html);
+                        } else {
+                            commentList.innerHTML = html;
+                        }
+                        if (page.next_cursor) {
+                            const moreBtn = document.createElement('button');
+                            moreBtn.type = 'button';
+                            moreBtn.className = 'ghost-btn load-more-comments';
+                            moreBtn.textContent = '加载更多评论';
+                            moreBtn.addEventListener('click', () => {
+                                moreBtn.disabled = true;
+                                loadComments(page.next_cursor);
+                            });
+                            commentList.appendChild(moreBtn);
+                        }
                     } catch (e) {
-                        commentList.innerHTML = '<p class="text-muted">加载评论失败</p>';
+                        if (cursor) {
+                            commentList.querySelector('.load-more-comments')?.removeAttribute('disabled');
+                        } else {
+                            commentList.innerHTML = '<p class="text-muted">加载评论失败</p>';
+                        }
                     }
                 };
 
@@ -33,7 +33,9 @@
                     tags: new Set(),
                     categories: new Set(),
                     sort: 'date-desc',
-                    fuzzyMode: false
+                    fuzzyMode: false,
+                    // 服务端全文检索命中的文章：slug -> 高亮摘要
+                    bodyMatches: new Map()
                 };
                 const uniqueTags = Array.from(new Set(tags)).filter(Boolean);
                 const uniqueCategories = Array.from(new Set(articles.map((article) => normalizeCategory(article.category))));
@@ -206,37 +208,79 @@
                     chatHistory.scrollTop = chatHistory.scrollHeight;
 
                     try {
-                        // 准备上下文数据 (精简字段以节省 token)
-                        const contextData = articles.map(a => ({
-                            title: a.title,
-                            desc: a.description,
-                            tags: a.tags,
-                            cat: a.category,
-                            slug: a.slug
-                        }));
-
-                        const response = await fetch('/api/ai/chat', {
+                        const response = await fetch('/api/ai/chat/stream', {
                             method: 'POST',
                             headers: {
                                 'Content-Type': 'application/json'
                             },
+                            // 相关文档由服务端按问题挑选，无需上传文档列表
                             body: JSON.stringify({
-                                message: query,
-                                context: contextData
+                                message: query
                             })
                         });
 
-                        if (!response.ok) {
+                        if (!response.ok || !response.body) {
                             const errData = await response.json().catch(() => ({}));
                             throw new Error(errData.error || `API Error: ${response.status}`);
                         }
 
-                        const data = await response.json();
-                        chatHistory.removeChild(loadingMsg);
-                        
-                        if (data.content) {
-                            appendMessage('system', data.content);
+                        // 逐段读取 SSE，收到第一个 token 后用回答气泡替换"思考中"
+                        const reader = response.body.getReader();
+                        const decoder = new TextDecoder();
+                        let buffer = '';
+                        let answer = '';
+                        let answerDiv = null;
+                        let renderPending = false;
+
+                        const renderAnswer = () => {
+                            renderPending = false;
+                            answerDiv.innerHTML = window.marked ? window.marked.parse(answer) : `<p>${answer}</p>`;
+                            chatHistory.scrollTop = chatHistory.scrollHeight;
+                        };
+
+                        const handleEvent = (rawEvent) => {
+                            let eventName = 'message';
+                            let dataText = '';
+                            rawEvent.split('\n').forEach((line) => {
+                                if (line.startsWith('event:')) eventName = line.slice(6).trim();
+                                else if (line.startsWith('data:')) dataText += line.slice(5).trim();
+                            });
+                            const payload = dataText ? JSON.parse(dataText) : {};
+                            if (eventName === 'error') {
+                                throw new Error(payload.error || '服务暂时不可用');
+                            }
+                            if (eventName === 'token' && payload.content) {
+                                if (!answerDiv) {
+                                    chatHistory.removeChild(loadingMsg);
+                                    answerDiv = document.createElement('div');
+                                    answerDiv.className = 'ai-message system';
+                                    chatHistory.appendChild(answerDiv);
+                                }
+                                answer += payload.content;
+                                // 每帧最多重新渲染一次 markdown
+                                if (!renderPending) {
+                                    renderPending = true;
+                                    requestAnimationFrame(renderAnswer);
+                                }
+                            }
+                        };
+
+                        while (true) {
+                            const { value, done } = await reader.read();
+                            if (done) break;
+                            buffer += decoder.decode(value, { stream: true });
+                            let boundary;
+                            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                                const rawEvent = buffer.slice(0, boundary);
+                                buffer = buffer.slice(boundary + 2);
+                                if (rawEvent.trim()) handleEvent(rawEvent);
+                            }
+                        }
+
+                        if (answerDiv) {
+                            renderAnswer();
                         } else {
+                            chatHistory.removeChild(loadingMsg);
                             appendMessage('system', '抱歉，我没有理解你的问题，或者服务暂时不可用。');
                         }
 
@@ -352,7 +396,8 @@
                                     article.description,
                                     article.category
                                 ];
-                                matchesKeyword = fields.some(field => field && field.toLowerCase().includes(keyword));
+                                matchesKeyword = fields.some(field => field && field.toLowerCase().includes(keyword))
+                                    || state.bodyMatches.has(article.slug);
                             }
                             return matchesKeyword && passesTaxonomy(article);
                         });
@@ -401,6 +446,7 @@
                         <article class="doc-card" data-doc-slug="${article.slug}">
                             <h3>${article.title}</h3>
                             <p>${article.description || '这篇文档还没有简介。'}</p>
+                            ${!useFuzzy && keyword && state.bodyMatches.has(article.slug) ? `<p class="text-muted search-snippet">${state.bodyMatches.get(article.slug)}</p>` : ''}
                             <div class="doc-meta">
                                 <span>🗂 ${article.category}</span>
                                 <span>🕒 ${article.date || '时间未知'}</span>
@@ -421,10 +467,37 @@
                     });
                 };
 
+                // 服务端全文检索（含正文），输入停顿后请求，过期的响应直接丢弃
+                let searchTimer = null;
+                let searchSeq = 0;
+                const fetchBodyMatches = () => {
+                    clearTimeout(searchTimer);
+                    const query = state.keyword.trim();
+                    const seq = ++searchSeq;
+                    if (!query) {
+                        state.bodyMatches = new Map();
+                        return;
+                    }
+                    searchTimer = setTimeout(async () => {
+                        try {
+                            const response = await fetch(`/api/search?q=${encodeURIComponent(query)}&per_page=50`);
+                            if (!response.ok || seq !== searchSeq) return;
+                            const data = await response.json();
+                            if (seq !== searchSeq) return;
+                            state.bodyMatches = new Map((data.results || []).map((item) => [item.slug, item.snippet]));
+                            renderResultList();
+                        } catch (error) {
+                            console.warn('全文检索失败', error);
+                        }
+                    }, 250);
+                };
+
                 // 事件监听：输入框
                 input?.addEventListener('input', (event) => {
                     state.keyword = event.target.value;
+                    state.bodyMatches = new Map();
                     renderResultList();
+                    fetchBodyMatches();
                 });
 
                 // 事件监听：排序下拉框
@@ -0,0 +1,151 @@
+"""
+数据库迁移
+按顺序执行的轻量迁移步骤，当前版本记录在 SQLite 的 PRAGMA user_version 中。
+新增表结构变更时在 MIGRATIONS 末尾追加一个函数即可，已执行过的步骤不会重复执行。
+"""
+import sqlite3
+
+from sqlalchemy import text
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.schema import CreateIndex
+
+from models import (
+    db, Visit, VisitDailyRollup, Comment, AIResponse, ArticleSearchDoc, get_schema_version, set_schema_version
+)
+
+
+def _create_tables():
+    """v1: 建表，并为已有访问记录回填访问日汇总"""
+    db.create_all()
+    if not VisitDailyRollup.query.first():
+        VisitDailyRollup.rebuild()
+
+
+def _create_hot_query_indexes():
+    """v2: 为高频查询添加组合索引（已存在的索引会跳过）"""
+    for table in (Visit.__table__, Comment.__table__):
+        for index in table.indexes:
+            index.create(bind=db.session.connection(), checkfirst=True)
+
+
+def _create_ai_response_table():
+    """v3: AI 回答持久化缓存表"""
+    AIResponse.__table__.create(bind=db.session.connection(), checkfirst=True)
+
+
+def _create_article_search_tables():
+    """
+    v4: 文章全文检索表
+    优先使用 trigram 分词（支持中文子串匹配，需要 SQLite >= 3.34），不可用时退回 unicode61
+    """
+    ArticleSearchDoc.__table__.create(bind=db.session.connection(), checkfirst=True)
+    columns = 'slug UNINDEXED, title, tags, category, description, body'
+    try:
+        with db.session.begin_nested():
+            db.session.execute(text(f"CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5({columns}, tokenize='trigram')"))
+    except OperationalError:
+        db.session.execute(text(f'CREATE VIRTUAL TABLE IF NOT EXISTS article_fts USING fts5({columns})'))
+
+
+def _create_comment_ip_index():
+    """v5: 每 IP 每日评论限额按 (ip_address, timestamp) 统计当天评论数"""
+    _create_hot_query_indexes()
+
+
+MIGRATIONS = [
+    _create_tables,
+    _create_hot_query_indexes,
+    _create_ai_response_table,
+    _create_article_search_tables,
+    _create_comment_ip_index,
+]
+
+# 数据库结构版本，等于迁移步骤数
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def run_migrations():
+    """
+    执行所有未执行的迁移步骤（需在 app_context 中调用）
+    返回迁移前的版本号；每完成一步就更新版本标记，中途失败下次会从失败处继续
+    """
+    previous = get_schema_version()
+    for version in range(previous + 1, SCHEMA_VERSION + 1):
+        MIGRATIONS[version - 1]()
+        set_schema_version(version)
+    return previous
+
+
+# 各接口的代表性查询，用于 EXPLAIN QUERY PLAN 报告
+HOT_QUERIES = [
+    ('record_visit: 当日去重 (数据库回退)',
+     'SELECT id FROM visit WHERE ip_address = ? AND path = ? AND timestamp >= ? LIMIT 1',
+     ('127.0.0.1', '/docs/welcome', '2024-01-01 00:00:00')),
+    ('bootstrap: 重建当日去重索引',
+     'SELECT DISTINCT ip_address, path FROM visit WHERE timestamp >= ?',
+     ('2024-01-01 00:00:00',)),
+    ('backfill-rollup: 按天汇总',
+     'SELECT date(timestamp), path, count(id) FROM visit WHERE timestamp IS NOT NULL '
+     'GROUP BY date(timestamp), path',
+     ()),
+    ('统计: 单路径访问记录',
+     'SELECT count(id) FROM visit WHERE path = ?',
+     ('/docs/welcome',)),
+    ('dashboard: 最近访问',
+     'SELECT * FROM visit ORDER BY timestamp DESC LIMIT 10',
+     ()),
+    ('get_comments: 文章评论分页',
+     "SELECT * FROM comment WHERE article_path = ? AND status = 'approved' "
+     'AND timestamp < ? ORDER BY timestamp DESC, id DESC LIMIT 21',
+     ('articles/welcome.md', '2030-01-01 00:00:00')),
+    ('add_comment: 每日评论限额',
+     'SELECT count(*) FROM comment WHERE user_id = ? AND timestamp >= ?',
+     (1, '2024-01-01 00:00:00')),
+    ('add_comment: 每 IP 每日评论限额',
+     'SELECT count(*) FROM comment WHERE ip_address = ? AND timestamp >= ?',
+     ('127.0.0.1', '2024-01-01 00:00:00')),
+    ('get_pending_comments: 待审核列表',
+     "SELECT * FROM comment WHERE status = 'pending' ORDER BY timestamp DESC",
+     ()),
+    ('delete_user: 删除用户评论',
+     'DELETE FROM comment WHERE user_id = ?',
+     (1,)),
+]
+
+
+def _explain(conn, sql, params):
+    rows = conn.execute(f'EXPLAIN QUERY PLAN {sql}', params).fetchall()
+    return [row[-1] for row in rows]
+
+
+def explain_report(db_path):
+    """
+    生成 EXPLAIN QUERY PLAN 报告，对比有无组合索引时的执行计划
+    在数据库的内存副本上执行，不会修改原数据库
+    """
+    source = sqlite3.connect(db_path)
+    conn = sqlite3.connect(':memory:')
+    try:
+        source.backup(conn)
+    finally:
+        source.close()
+
+    indexes = [index for table in (Visit.__table__, Comment.__table__) for index in table.indexes]
+    dialect = sqlite_dialect.dialect()
+    for index in indexes:
+        conn.execute(f'DROP INDEX IF EXISTS {index.name}')
+    before = [_explain(conn, sql, params) for _, sql, params in HOT_QUERIES]
+    for index in indexes:
+        conn.execute(str(CreateIndex(index).compile(dialect=dialect)))
+    after = [_explain(conn, sql, params) for _, sql, params in HOT_QUERIES]
+    conn.close()
+
+    lines = []
+    for (name, sql, _), plan_before, plan_after in zip(HOT_QUERIES, before, after):
+        lines.append(f'## {name}')
+        lines.append(f'   {sql}')
+        lines.append('   before: ' + ' | '.join(plan_before))
+        lines.append('   after:  ' + ' | '.join(plan_after))
+        lines.append('')
+    return '\n'.join(lines)
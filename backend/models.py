@@ -1,9 +1,25 @@
+import threading
+import time
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from collections import Counter
+from sqlalchemy import cast, func, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from werkzeug.security import generate_password_hash, check_password_hash
 
 db = SQLAlchemy()
 
+
+def get_schema_version():
+    """读取数据库中记录的结构版本"""
+    return db.session.execute(text('PRAGMA user_version')).scalar() or 0
+
+
+def set_schema_version(version):
+    """写入结构版本标记"""
+    db.session.execute(text(f'PRAGMA user_version = {int(version)}'))
+    db.session.commit()
+
 class User(db.Model):
     """
     用户模型
@@ -48,44 +64,195 @@ class SystemConfig(db.Model):
     """
     系统配置模型
     存储全局设置（如自动批准用户等）
+    读取走进程内缓存：首次读取时整表加载到字典，之后只在版本号变化时重新加载。
+    版本号保存在 key 为 VERSION_KEY 的行中，每次写入都会递增，
+    其他 worker 进程每隔 CACHE_CHECK_SECONDS 秒检查一次即可发现变更。
     """
     id = db.Column(db.Integer, primary_key=True)
     key = db.Column(db.String(50), unique=True, nullable=False)
     value = db.Column(db.String(255), nullable=False)
+
+    VERSION_KEY = '_config_version'
+    CACHE_CHECK_SECONDS = 1.0
+
+    _cache = None
+    _cache_version = None
+    _cache_checked_at = 0.0
+    _cache_lock = threading.Lock()
     
     @staticmethod
     def get(key, default='false'):
         """获取配置值"""
-        config = SystemConfig.query.filter_by(key=key).first()
-        return config.value if config else default
+        values = SystemConfig._cached_values()
+        return values[key] if key in values else default
     
     @staticmethod
     def set(key, value):
         """设置配置值"""
-        config = SystemConfig.query.filter_by(key=key).first()
-        if config:
-            config.value = value
-        else:
-            config = SystemConfig(key=key, value=value)
-            db.session.add(config)
+        SystemConfig.set_many({key: value})
+
+    @staticmethod
+    def set_many(values, overwrite=True):
+        """
+        批量设置配置值，所有变更在一个事务中提交
+        值未变化的键会被跳过；overwrite=False 时只写入尚不存在的键
+        返回实际写入的 {key: value}
+        """
+        existing = {
+            config.key: config
+            for config in SystemConfig.query.filter(SystemConfig.key.in_(list(values))).all()
+        }
+        changed = {}
+        for key, value in values.items():
+            config = existing.get(key)
+            if config is None:
+                db.session.add(SystemConfig(key=key, value=value))
+            elif overwrite and config.value != value:
+                config.value = value
+            else:
+                continue
+            changed[key] = value
+        if not changed:
+            return changed
+        version = SystemConfig._bump_version()
         db.session.commit()
+        with SystemConfig._cache_lock:
+            previous = SystemConfig._cache_version
+            if SystemConfig._cache is not None and previous is not None and int(version) == int(previous) + 1:
+                SystemConfig._cache = dict(SystemConfig._cache, **changed)
+                SystemConfig._cache_version = version
+            else:
+                # 版本号跳过了其他进程的写入，本地缓存已过期，下次读取时整表重新加载
+                SystemConfig._cache = None
+                SystemConfig._cache_version = None
+        return changed
+
+    @staticmethod
+    def ensure_defaults(defaults):
+        """
+        写入缺失的默认配置，返回新写入的键
+        整表只读取一次（同时预热缓存），缺失的键在一个事务中写入
+        """
+        values = SystemConfig._cached_values()
+        missing = {key: value for key, value in defaults.items() if key not in values}
+        if not missing:
+            return {}
+        return SystemConfig.set_many(missing, overwrite=False)
+
+    @staticmethod
+    def invalidate_cache():
+        """丢弃进程内缓存，下次读取时重新加载"""
+        with SystemConfig._cache_lock:
+            SystemConfig._cache = None
+            SystemConfig._cache_version = None
+
+    @staticmethod
+    def _cached_values():
+        now = time.monotonic()
+        cache = SystemConfig._cache
+        if cache is not None and now - SystemConfig._cache_checked_at < SystemConfig.CACHE_CHECK_SECONDS:
+            return cache
+        with SystemConfig._cache_lock:
+            if SystemConfig._cache is not None:
+                version = db.session.query(SystemConfig.value).filter_by(
+                    key=SystemConfig.VERSION_KEY
+                ).scalar() or '0'
+                if version == SystemConfig._cache_version:
+                    SystemConfig._cache_checked_at = now
+                    return SystemConfig._cache
+            values = dict(db.session.query(SystemConfig.key, SystemConfig.value).all())
+            SystemConfig._cache_version = values.pop(SystemConfig.VERSION_KEY, '0')
+            SystemConfig._cache = values
+            SystemConfig._cache_checked_at = now
+            return values
+
+    @staticmethod
+    def _bump_version():
+        """在当前事务中递增配置版本号，返回新版本号"""
+        table = SystemConfig.__table__
+        result = db.session.execute(
+            table.update()
+            .where(table.c.key == SystemConfig.VERSION_KEY)
+            .values(value=cast(cast(table.c.value, db.Integer) + 1, db.String))
+        )
+        if result.rowcount == 0:
+            db.session.add(SystemConfig(key=SystemConfig.VERSION_KEY, value='1'))
+            db.session.flush()
+        return db.session.query(SystemConfig.value).filter_by(key=SystemConfig.VERSION_KEY).scalar()
 
 class Visit(db.Model):
     """
     访问记录模型
     用于统计网站的访问量，包含去重逻辑（在 app.py 中实现）
     """
+    __table_args__ = (
+        db.Index('ix_visit_ip_path_timestamp', 'ip_address', 'path', 'timestamp'),  # 当日去重
+        db.Index('ix_visit_path', 'path'),
+        db.Index('ix_visit_timestamp', 'timestamp'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     path = db.Column(db.String(255), nullable=False)  # 访问路径
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # 访问时间
     ip_address = db.Column(db.String(50))  # 访客 IP
     article_slug = db.Column(db.String(255), nullable=True)  # 关联的文章 Slug（可选）
 
+class VisitDailyRollup(db.Model):
+    """
+    访问日汇总模型
+    按 (日期, 路径) 预聚合访问次数，统计接口只需扫描天数级别的数据
+    随访问记录增量维护，历史数据可通过 `flask --app app backfill-rollup` 回填
+    """
+    date = db.Column(db.Date, primary_key=True)  # 访问日期 (与 Visit.timestamp 同为 UTC)
+    path = db.Column(db.String(255), primary_key=True)  # 访问路径
+    count = db.Column(db.Integer, nullable=False, default=0)  # 当日访问次数
+
+    @staticmethod
+    def add_visits(rows):
+        """
+        按访问记录累加计数（不提交事务，由调用方与 Visit 写入一起提交）
+        rows: 包含 path 和 timestamp 的字典列表
+        """
+        counter = Counter((row['timestamp'].date(), row['path']) for row in rows)
+        if not counter:
+            return
+        stmt = sqlite_insert(VisitDailyRollup.__table__)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['date', 'path'],
+            set_={'count': VisitDailyRollup.__table__.c.count + stmt.excluded.count}
+        )
+        db.session.execute(stmt, [
+            {'date': day, 'path': path, 'count': count}
+            for (day, path), count in counter.items()
+        ])
+
+    @staticmethod
+    def rebuild():
+        """根据 Visit 表全量重建汇总数据，返回生成的汇总行数"""
+        VisitDailyRollup.query.delete()
+        daily = select(
+            func.date(Visit.timestamp),
+            Visit.path,
+            func.count(Visit.id)
+        ).where(Visit.timestamp.isnot(None)).group_by(func.date(Visit.timestamp), Visit.path)
+        db.session.execute(
+            VisitDailyRollup.__table__.insert().from_select(['date', 'path', 'count'], daily)
+        )
+        db.session.commit()
+        return VisitDailyRollup.query.count()
+
 class Comment(db.Model):
     """
     评论模型
     存储用户对文章的评论，支持审核状态
     """
+    __table_args__ = (
+        db.Index('ix_comment_article_status_timestamp', 'article_path', 'status', 'timestamp'),  # 文章评论分页
+        db.Index('ix_comment_user_timestamp', 'user_id', 'timestamp'),  # 每日评论限额
+        db.Index('ix_comment_ip_timestamp', 'ip_address', 'timestamp'),  # 每 IP 每日评论限额
+        db.Index('ix_comment_status_timestamp', 'status', 'timestamp'),  # 待审核列表
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     article_path = db.Column(db.String(255), nullable=False)  # 关联的文章路径
     content = db.Column(db.Text, nullable=False)  # 评论内容
@@ -115,3 +282,50 @@ class Comment(db.Model):
             'timestamp': self.timestamp.isoformat(),
             'status': self.status
         }
+
+
+class AIResponse(db.Model):
+    """
+    AI 回答持久化缓存
+    内存缓存的二级存储，按请求内容的哈希保存模型回答，进程重启后仍可命中
+    """
+    key = db.Column(db.String(64), primary_key=True)  # (模型, 系统提示词, 上下文, 问题) 的 SHA-256
+    content = db.Column(db.Text, nullable=False)  # 模型回答
+    latency_ms = db.Column(db.Float, nullable=False, default=0)  # 生成该回答时上游的耗时
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    @staticmethod
+    def get_valid(key):
+        """读取未过期的回答，不存在或已过期返回 None"""
+        return AIResponse.query.filter(
+            AIResponse.key == key, AIResponse.expires_at > datetime.utcnow()
+        ).first()
+
+    @staticmethod
+    def put(key, content, latency_ms, expires_at):
+        db.session.merge(AIResponse(key=key, content=content, latency_ms=latency_ms, expires_at=expires_at))
+        db.session.commit()
+
+    @staticmethod
+    def purge_expired():
+        """删除已过期的回答，返回删除的行数"""
+        deleted = AIResponse.query.filter(AIResponse.expires_at <= datetime.utcnow()).delete()
+        db.session.commit()
+        return deleted
+
+    @staticmethod
+    def clear():
+        AIResponse.query.delete()
+        db.session.commit()
+
+
+class ArticleSearchDoc(db.Model):
+    """
+    全文检索索引的登记表
+    记录每篇文章写入 article_fts 时的来源签名（元数据 + 正文文件的大小和修改时间），
+    签名不变的文章在增量重建时跳过
+    """
+    slug = db.Column(db.String(255), primary_key=True)
+    signature = db.Column(db.String(64), nullable=False)
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -0,0 +1,219 @@
+"""
+页面代理响应缓存
+缓存已经重写过的 HTML/CSS 响应体，按上游的 Cache-Control / Expires 判断新鲜度，
+过期后带 ETag / Last-Modified 发起条件请求，上游返回 304 时直接复用缓存内容。
+内存中按总字节数做 LRU 淘汰，可选把被淘汰的条目写入磁盘目录作为二级缓存。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+from cache import LRUCache
+
+
+def parse_cache_control(value):
+    """解析 Cache-Control 头，返回 {指令: 值或 None}"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, arg = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip().strip('"') or None
+    return directives
+
+
+def _parse_http_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class ProxyCache:
+    """
+    代理响应缓存
+    max_bytes: 内存缓存的总字节数上限
+    default_ttl: 上游没有给出缓存策略时的有效期（秒）
+    spill_dir: 磁盘二级缓存目录，为 None 时不落盘
+    max_spill_bytes: 磁盘缓存的总字节数上限
+    max_entry_bytes: 单个条目的大小上限，默认为 max_bytes 的 1/8
+    """
+
+    def __init__(self, max_bytes=32 * 1024 * 1024, default_ttl=60, spill_dir=None,
+                 max_spill_bytes=256 * 1024 * 1024, max_entry_bytes=None):
+        self.default_ttl = default_ttl
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self.spill_dir = spill_dir
+        self.max_spill_bytes = max_spill_bytes
+        self._memory = LRUCache(max_entries=100000, max_bytes=max_bytes,
+                                on_evict=self._spill if spill_dir else None)
+        self._counters = {'hits': 0, 'misses': 0, 'revalidated': 0, 'stores': 0,
+                          'uncacheable': 0, 'spill_reads': 0, 'spill_writes': 0}
+        self._counter_lock = threading.Lock()
+        self._spill_lock = threading.Lock()
+        if spill_dir:
+            os.makedirs(spill_dir, exist_ok=True)
+
+    def lookup(self, url):
+        """查找缓存条目（可能已过期），未命中返回 None"""
+        entry = self._memory.get(url)
+        if entry is None and self.spill_dir:
+            entry = self._load_spilled(url)
+            if entry is not None:
+                self._count('spill_reads')
+                self._memory.set(url, entry, size=len(entry['body']))
+        return entry
+
+    @staticmethod
+    def is_fresh(entry):
+        return entry['expires_at'] > time.time()
+
+    @staticmethod
+    def conditional_headers(entry):
+        """过期条目重新验证时使用的条件请求头"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, body, content_type, upstream_headers):
+        """按上游响应头决定是否缓存，返回缓存条目；不可缓存时返回 None"""
+        ttl = self._freshness(upstream_headers)
+        if ttl is None or len(body) > self.max_entry_bytes:
+            self._count('uncacheable')
+            return None
+        now = time.time()
+        entry = {
+            'url': url,
+            'body': body,
+            'content_type': content_type,
+            'etag': upstream_headers.get('ETag'),
+            'last_modified': upstream_headers.get('Last-Modified'),
+            'stored_at': now,
+            'expires_at': now + ttl,
+        }
+        self._memory.set(url, entry, size=len(body))
+        self._count('stores')
+        return entry
+
+    def refresh(self, url, entry, upstream_headers):
+        """上游返回 304 后更新条目的有效期和校验值"""
+        ttl = self._freshness(upstream_headers)
+        if ttl is None:
+            self._memory.delete(url)
+            return entry
+        entry = dict(entry, expires_at=time.time() + ttl)
+        for field, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+            if upstream_headers.get(header):
+                entry[field] = upstream_headers[header]
+        self._memory.set(url, entry, size=len(entry['body']))
+        return entry
+
+    def record(self, outcome):
+        """记录一次请求的结果: hits / misses / revalidated"""
+        self._count(outcome)
+
+    def clear(self):
+        self._memory.clear()
+        if self.spill_dir:
+            with self._spill_lock:
+                for name in os.listdir(self.spill_dir):
+                    os.remove(os.path.join(self.spill_dir, name))
+
+    def stats(self):
+        with self._counter_lock:
+            stats = dict(self._counters)
+        memory = self._memory.stats()
+        stats.update({'entries': memory['entries'], 'bytes': memory['bytes'], 'evictions': memory['evictions']})
+        lookups = stats['hits'] + stats['revalidated'] + stats['misses']
+        stats['hit_rate'] = round((stats['hits'] + stats['revalidated']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    def _freshness(self, headers):
+        """根据上游响应头计算有效期（秒），不可缓存时返回 None"""
+        directives = parse_cache_control(headers.get('Cache-Control'))
+        if 'no-store' in directives or 'private' in directives:
+            return None
+        if headers.get('Set-Cookie') or (headers.get('Vary') or '').strip() == '*':
+            return None
+        for name in ('s-maxage', 'max-age'):
+            if directives.get(name):
+                try:
+                    return max(int(directives[name]), 0)
+                except ValueError:
+                    pass
+        if 'no-cache' in directives:
+            return 0
+        expires = _parse_http_date(headers.get('Expires'))
+        if expires is not None:
+            date = _parse_http_date(headers.get('Date')) or time.time()
+            return max(expires - date, 0)
+        return self.default_ttl
+
+    def _count(self, name):
+        with self._counter_lock:
+            self._counters[name] += 1
+
+    # ---------- 磁盘二级缓存 ----------
+
+    def _spill_paths(self, url):
+        digest = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.spill_dir, digest)
+        return base + '.json', base + '.body'
+
+    def _spill(self, url, entry):
+        meta_path, body_path = self._spill_paths(url)
+        meta = {key: value for key, value in entry.items() if key != 'body'}
+        with self._spill_lock:
+            try:
+                with open(body_path, 'wb') as f:
+                    f.write(entry['body'])
+                with open(meta_path, 'w', encoding='utf-8') as f:
+                    json.dump(meta, f)
+            except OSError:
+                return
+            self._count('spill_writes')
+            self._prune_spill()
+
+    def _load_spilled(self, url):
+        meta_path, body_path = self._spill_paths(url)
+        with self._spill_lock:
+            try:
+                with open(meta_path, encoding='utf-8') as f:
+                    meta = json.load(f)
+                with open(body_path, 'rb') as f:
+                    body = f.read()
+            except (OSError, ValueError):
+                return None
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        if meta.get('url') != url:
+            return None
+        return dict(meta, body=body)
+
+    def _prune_spill(self):
+        files = []
+        total = 0
+        for name in os.listdir(self.spill_dir):
+            path = os.path.join(self.spill_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        files.sort()
+        while files and total > self.max_spill_bytes:
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
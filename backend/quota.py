@@ -0,0 +1,114 @@
+"""
+频率限制与配额
+所有计数都保存在进程内存中，判断是否超限为 O(1)，不再查询数据库
+"""
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+
+
+class QuotaResult:
+    """一次配额检查的结果，用于生成 X-RateLimit-* 响应头"""
+
+    __slots__ = ('allowed', 'limit', 'remaining', 'reset_at')
+
+    def __init__(self, allowed, limit, remaining, reset_at):
+        self.allowed = allowed
+        self.limit = limit
+        self.remaining = remaining
+        self.reset_at = reset_at  # 配额恢复的 Unix 时间戳
+
+    def headers(self):
+        return {
+            'X-RateLimit-Limit': str(self.limit),
+            'X-RateLimit-Remaining': str(self.remaining),
+            'X-RateLimit-Reset': str(int(self.reset_at)),
+        }
+
+
+class DailyQuota:
+    """
+    每日配额计数器
+    每个键在当天第一次使用时通过 seed(key) 从数据库加载已用次数，之后只在内存中累加，
+    跨过零点后全部清空。多进程部署时每个进程各自计数，实际上限最多放大到进程数倍。
+    """
+
+    def __init__(self, limit, seed=None):
+        self.limit = limit
+        self.seed = seed
+        self._day = None
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """尝试使用一次配额"""
+        self._load(key)
+        with self._lock:
+            used = self._counts.get(key, 0)
+            allowed = used < self.limit
+            if allowed:
+                used += 1
+                self._counts[key] = used
+            return QuotaResult(allowed, self.limit, max(self.limit - used, 0), self._reset_at())
+
+    def release(self, key):
+        """归还一次配额（操作最终失败时调用）"""
+        with self._lock:
+            if self._counts.get(key, 0) > 0:
+                self._counts[key] -= 1
+
+    def _load(self, key):
+        with self._lock:
+            today = date.today()
+            if self._day != today:
+                self._day = today
+                self._counts = {}
+            if key in self._counts:
+                return
+        # 在锁外查询数据库，避免阻塞其他键的检查
+        used = self.seed(key) if self.seed else 0
+        with self._lock:
+            self._counts.setdefault(key, used)
+
+    def _reset_at(self):
+        tomorrow = datetime.combine(self._day + timedelta(days=1), datetime.min.time())
+        return tomorrow.timestamp()
+
+
+class SlidingWindowLimiter:
+    """
+    滑动窗口限流：任意 window_seconds 秒内每个键最多 limit 次
+    """
+
+    # 每处理这么多次请求清理一次过期的键，防止内存无限增长
+    PRUNE_EVERY = 1000
+
+    def __init__(self, limit, window_seconds):
+        self.limit = limit
+        self.window = window_seconds
+        self._hits = {}
+        self._calls = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, key):
+        """尝试使用一次配额"""
+        now = time.time()
+        cutoff = now - self.window
+        with self._lock:
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                self._prune(cutoff)
+            hits = self._hits.setdefault(key, deque())
+            while hits and hits[0] <= cutoff:
+                hits.popleft()
+            allowed = len(hits) < self.limit
+            if allowed:
+                hits.append(now)
+            reset_at = hits[0] + self.window if hits else now
+            return QuotaResult(allowed, self.limit, max(self.limit - len(hits), 0), reset_at)
+
+    def _prune(self, cutoff):
+        stale = [key for key, hits in self._hits.items() if not hits or hits[-1] <= cutoff]
+        for key in stale:
+            del self._hits[key]
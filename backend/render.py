@@ -0,0 +1,221 @@
+"""
+文章渲染
+把 Markdown 文章渲染为经过清洗的 HTML 和标题大纲，按源文件内容的哈希缓存：
+内存中做 LRU，磁盘上保存在 data/rendered/ 下，可在部署时用 `flask --app app render-articles` 预先生成。
+渲染依赖 Python-Markdown（pip install markdown），未安装时 available 为 False，由前端退回浏览器端渲染。
+"""
+import hashlib
+import html
+import json
+import os
+import threading
+from html.parser import HTMLParser
+
+try:
+    import markdown
+    from markdown.extensions.toc import slugify_unicode
+except ImportError:  # 可选依赖
+    markdown = None
+
+from cache import LRUCache
+
+# 渲染规则变化时递增，使旧的缓存全部失效
+RENDERER_VERSION = '1'
+
+ALLOWED_TAGS = {
+    'a', 'abbr', 'b', 'blockquote', 'br', 'code', 'dd', 'del', 'details', 'div', 'dl', 'dt', 'em',
+    'figcaption', 'figure', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'hr', 'i', 'img', 'ins', 'kbd', 'li',
+    'mark', 'ol', 'p', 'pre', 's', 'span', 'strong', 'sub', 'summary', 'sup', 'table', 'tbody', 'td',
+    'tfoot', 'th', 'thead', 'tr', 'ul',
+}
+VOID_TAGS = {'br', 'hr', 'img'}
+# 连同内容一起丢弃的标签
+DROP_CONTENT_TAGS = {'script', 'style', 'iframe', 'object', 'embed', 'template', 'noscript'}
+GLOBAL_ATTRS = {'id', 'class', 'title'}
+TAG_ATTRS = {
+    'a': {'href', 'name'},
+    'img': {'src', 'alt', 'width', 'height'},
+    'ol': {'start'},
+    'td': {'align', 'colspan', 'rowspan'},
+    'th': {'align', 'colspan', 'rowspan'},
+}
+URL_ATTRS = {'href', 'src'}
+SAFE_URL_SCHEMES = ('http:', 'https:', 'mailto:')
+
+
+def _safe_url(value):
+    """只允许 http/https/mailto 和相对地址"""
+    compact = ''.join(value.split()).lower()
+    if ':' not in compact.split('/', 1)[0].split('?', 1)[0].split('#', 1)[0]:
+        return True
+    return compact.startswith(SAFE_URL_SCHEMES)
+
+
+class _Sanitizer(HTMLParser):
+    """按白名单清洗 HTML：不在白名单的标签去掉但保留文字，脚本类标签连同内容删除"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.out = []
+        self._open = []
+        self._dropping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping += 1
+            return
+        if self._dropping or tag not in ALLOWED_TAGS:
+            return
+        allowed = GLOBAL_ATTRS | TAG_ATTRS.get(tag, set())
+        parts = [tag]
+        for name, value in attrs:
+            if name not in allowed or value is None:
+                continue
+            if name in URL_ATTRS and not _safe_url(value):
+                continue
+            parts.append(f'{name}="{html.escape(value, quote=True)}"')
+        self.out.append('<' + ' '.join(parts) + '>')
+        if tag not in VOID_TAGS:
+            self._open.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in DROP_CONTENT_TAGS:
+            return
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS and self._open and self._open[-1] == tag:
+            self._open.pop()
+            self.out.append(f'</{tag}>')
+
+    def handle_endtag(self, tag):
+        if tag in DROP_CONTENT_TAGS:
+            self._dropping = max(self._dropping - 1, 0)
+            return
+        if self._dropping or tag not in self._open:
+            return
+        # 补齐未闭合的内层标签
+        while self._open:
+            current = self._open.pop()
+            self.out.append(f'</{current}>')
+            if current == tag:
+                break
+
+    def handle_data(self, data):
+        if not self._dropping:
+            self.out.append(html.escape(data, quote=False))
+
+    def close(self):
+        super().close()
+        while self._open:
+            self.out.append(f'</{self._open.pop()}>')
+        return ''.join(self.out)
+
+
+def sanitize_html(content):
+    """按白名单清洗 HTML 片段"""
+    parser = _Sanitizer()
+    parser.feed(content)
+    return parser.close()
+
+
+def _flatten_toc(tokens, outline):
+    for token in tokens:
+        outline.append({'level': token['level'], 'id': token['id'], 'text': html.unescape(token['name'])})
+        _flatten_toc(token['children'], outline)
+    return outline
+
+
+def render_markdown(source):
+    """
+    渲染 Markdown，返回 {'html': 清洗后的 HTML, 'outline': [{level, id, text}]}
+    扩展选择与前端 marked 的 gfm + breaks 配置保持一致（表格、围栏代码、软换行转 <br>）
+    """
+    md = markdown.Markdown(
+        extensions=['extra', 'sane_lists', 'nl2br', 'toc'],
+        extension_configs={'toc': {'slugify': slugify_unicode}},
+        output_format='html',
+    )
+    body = md.convert(source)
+    return {'html': sanitize_html(body), 'outline': _flatten_toc(md.toc_tokens, [])}
+
+
+class ArticleRenderer:
+    """
+    文章渲染缓存
+    cache_dir: 磁盘缓存目录，为 None 时只缓存在内存中
+    max_bytes: 内存缓存的总字节数上限
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=16 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self._memory = LRUCache(max_entries=10000, max_bytes=max_bytes)
+        self._digests = {}  # 源文件路径 -> ((大小, 修改时间), 哈希)，文件未变化时不重复读取计算
+        self._lock = threading.Lock()
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @property
+    def available(self):
+        return markdown is not None
+
+    def digest(self, path):
+        """源文件内容哈希（含渲染器版本），同时用作缓存键和 ETag"""
+        stat = os.stat(path)
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+        cached = self._digests.get(path)
+        if cached and cached[0] == fingerprint:
+            return cached[1]
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(RENDERER_VERSION.encode() + b'\0' + f.read()).hexdigest()
+        with self._lock:
+            self._digests[path] = (fingerprint, digest)
+        return digest
+
+    def render(self, path):
+        """返回 (哈希, {'html', 'outline'})；依次查找内存缓存、磁盘缓存，都没有时渲染"""
+        digest = self.digest(path)
+        result = self._memory.get(digest)
+        if result is None:
+            result = self._load(digest)
+            if result is None:
+                with open(path, encoding='utf-8', errors='replace') as f:
+                    result = render_markdown(f.read())
+                self._save(digest, result)
+            self._memory.set(digest, result, size=len(result['html'].encode('utf-8')))
+        return digest, result
+
+    def _cache_path(self, digest):
+        return os.path.join(self.cache_dir, digest + '.json')
+
+    def _load(self, digest):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self._cache_path(digest), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save(self, digest, result):
+        if not self.cache_dir:
+            return
+        tmp_path = self._cache_path(digest) + f'.{os.getpid()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False)
+            os.replace(tmp_path, self._cache_path(digest))
+        except OSError:
+            pass
+
+    def prune(self, keep):
+        """删除磁盘上不在 keep（哈希集合）中的渲染结果，返回删除的文件数"""
+        if not self.cache_dir:
+            return 0
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json') and name[:-5] not in keep:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                    removed += 1
+                except OSError:
+                    pass
+        return removed
@@ -0,0 +1,179 @@
+"""
+服务端渲染的应用外壳
+把 main.html、资源清单和首屏关键 CSS 直接写入 index.html，浏览器不必依次请求 main.html → 清单 → 资源。
+渲染结果按 CDN 地址缓存，相关文件（模板、清单、样式、构建结果）修改后自动重新渲染。
+"""
+import json
+import os
+import re
+import threading
+
+from assets import ASSET_MANIFEST_NAME, DIST_DIR
+
+COMMENT_PATTERN = re.compile(r'/\*.*?\*/', re.DOTALL)
+CLASS_ATTR_PATTERN = re.compile(r'\bclass="([^"]*)"')
+ID_ATTR_PATTERN = re.compile(r'\bid="([^"]*)"')
+SELECTOR_CLASS_PATTERN = re.compile(r'\.(-?[_a-zA-Z][\w-]*)')
+SELECTOR_ID_PATTERN = re.compile(r'#(-?[_a-zA-Z][\w-]*)')
+# 内容需要递归筛选的 at 规则，其余（@keyframes、@font-face 等）不算首屏关键样式
+NESTED_AT_RULES = ('@media', '@supports', '@layer')
+
+
+def _matching_brace(css, start):
+    """css[start] 为 '{'，返回与之匹配的 '}' 的位置（跳过字符串）"""
+    depth = 0
+    quote = None
+    for index in range(start, len(css)):
+        char = css[index]
+        if quote:
+            if char == quote and css[index - 1] != '\\':
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char == '{':
+            depth += 1
+        elif char == '}':
+            depth -= 1
+            if depth == 0:
+                return index
+    return len(css)
+
+
+def _selector_used(selector, classes, ids):
+    return (all(name in classes for name in SELECTOR_CLASS_PATTERN.findall(selector))
+            and all(name in ids for name in SELECTOR_ID_PATTERN.findall(selector)))
+
+
+def extract_critical_css(css, markup):
+    """
+    从 css 中挑出 markup 用得到的规则：选择器中出现的 class / id 都存在于 markup 中
+    （只有标签、属性或 :root 的规则总是保留）；@media 等分组规则递归筛选，@keyframes / @font-face 等跳过
+    """
+    classes = {name for value in CLASS_ATTR_PATTERN.findall(markup) for name in value.split()}
+    ids = set(ID_ATTR_PATTERN.findall(markup))
+    return _filter_rules(COMMENT_PATTERN.sub('', css), classes, ids)
+
+
+def _filter_rules(css, classes, ids):
+    out = []
+    position = 0
+    while position < len(css):
+        brace = css.find('{', position)
+        semicolon = css.find(';', position)
+        if brace == -1:
+            break
+        if semicolon != -1 and semicolon < brace:
+            # @charset / @import 等语句
+            position = semicolon + 1
+            continue
+        prelude = css[position:brace].strip()
+        end = _matching_brace(css, brace)
+        body = css[brace + 1:end]
+        position = end + 1
+        if prelude.startswith('@'):
+            if prelude.startswith(NESTED_AT_RULES):
+                inner = _filter_rules(body, classes, ids)
+                if inner:
+                    out.append(f'{prelude}{{{inner}}}')
+            continue
+        if any(_selector_used(selector, classes, ids) for selector in prelude.split(',')):
+            out.append(f'{prelude}{{{body.strip()}}}')
+    return ''.join(out)
+
+
+class ShellRenderer:
+    """
+    应用外壳渲染
+    frontend_dir: 前端目录（模板、main.html 和样式所在位置）
+    asset_manifest: AssetManifest 实例，构建过时使用带哈希的资源清单
+    jinja_env: 用于渲染 index.html 的 Jinja 环境（直接读取文件渲染，文件修改后立即生效）
+    critical_css: 提取首屏关键样式的 CSS 文件（相对于 frontend）
+    """
+
+    def __init__(self, frontend_dir, asset_manifest, jinja_env, critical_css=('css/main.css',)):
+        self.frontend_dir = frontend_dir
+        self.asset_manifest = asset_manifest
+        self.jinja_env = jinja_env
+        self.critical_css = tuple(critical_css)
+        self._cache = {}  # CDN 地址 -> (文件签名, HTML)
+        self._lock = threading.Lock()
+
+    def render(self, cdn_url):
+        """返回内联了外壳的 index.html；依赖的文件都没有变化时直接使用缓存"""
+        manifest_key = self.asset_manifest.manifest_key('index')
+        manifest_file = f'{manifest_key}-map.json' if manifest_key else 'index-map.json'
+        # asset-manifest.json 决定模板中 asset_path() 的结果（如带哈希的 load.js）
+        build_file = f'{DIST_DIR}/{ASSET_MANIFEST_NAME}'
+        signature = self._signature(('index.html', 'main.html', manifest_file, build_file) + self.critical_css)
+        signature += (manifest_key,)
+        cached = self._cache.get(cdn_url)
+        if cached and cached[0] == signature:
+            return cached[1]
+        with self._lock:
+            cached = self._cache.get(cdn_url)
+            if cached and cached[0] == signature:
+                return cached[1]
+            html = self._render(cdn_url, manifest_key or '/index', manifest_file)
+            self._cache[cdn_url] = (signature, html)
+            return html
+
+    def _path(self, relative):
+        return os.path.join(self.frontend_dir, *relative.split('/'))
+
+    def _signature(self, files):
+        signature = []
+        for relative in files:
+            try:
+                stat = os.stat(self._path(relative))
+                signature.append((stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def _read(self, relative):
+        try:
+            with open(self._path(relative), encoding='utf-8') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _render(self, cdn_url, manifest_key, manifest_file):
+        main_source = self._read('main.html')
+        shell_html = None
+        if main_source is not None:
+            shell_html = self.jinja_env.from_string(main_source).render(cdn_url=cdn_url)
+            # 关键样式已内联，外壳无需等待全部资源加载完即可显示
+            shell_html = shell_html.replace('data-shell="booting"', 'data-shell="ready"', 1)
+
+        manifest = None
+        manifest_source = self._read(manifest_file)
+        if manifest_source is not None:
+            try:
+                manifest = json.loads(manifest_source)
+            except ValueError:
+                pass
+
+        preloads = []
+        if manifest:
+            for group, kind in (('css', 'style'), ('js', 'script')):
+                for ref, mode in manifest.get(group) or []:
+                    href = ref if mode == 1 else f"{cdn_url.rstrip('/')}/{ref.lstrip('/')}"
+                    preloads.append({'href': href, 'as': kind})
+
+        critical = []
+        if shell_html:
+            for relative in self.critical_css:
+                css = self._read(relative)
+                if css:
+                    # 避免样式内容中的 "</" 提前结束 <style>
+                    critical.append(extract_critical_css(css, shell_html).replace('</', '<\\/'))
+
+        template = self.jinja_env.from_string(self._read('index.html') or '')
+        return template.render(
+            cdn_url=cdn_url,
+            asset_manifest_key=manifest_key,
+            shell_html=shell_html,
+            inline_manifest=manifest,
+            preloads=preloads,
+            critical_css=''.join(critical),
+        )
@@ -0,0 +1,301 @@
+"""
+访问统计相关的后台组件
+记录请求只负责入队，真正的数据库写入由后台线程批量完成
+"""
+import atexit
+import heapq
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+from models import db, Visit, VisitDailyRollup
+
+
+class VisitDedupIndex:
+    """
+    当日访问去重索引
+    内存中维护 "今天" 出现过的 (IP, 路径) 集合，去重判断不再查询 Visit 表。
+    启动时从今天的记录重建，跨过零点后整体丢弃，内存和耗时只与当天访客数有关。
+    多进程部署时可开启 db_fallback：内存未命中时再查一次数据库，保证跨进程精确去重。
+    """
+
+    def __init__(self, app, db_fallback=False):
+        self.app = app
+        self.db_fallback = db_fallback
+        self._day = None
+        self._seen = set()
+        self._lock = threading.Lock()
+
+    def rebuild(self):
+        """从数据库加载今天已有的访问记录（需在 app_context 中调用）"""
+        today = date.today()
+        rows = db.session.query(Visit.ip_address, Visit.path).filter(
+            Visit.timestamp >= self._day_start(today)
+        ).distinct().all()
+        with self._lock:
+            self._day = today
+            self._seen = {(ip_address, path) for ip_address, path in rows}
+        return len(rows)
+
+    def add(self, ip_address, path):
+        """
+        登记一次访问，返回 True 表示今天首次出现（应当记录），False 表示重复
+        判断与登记在同一把锁内完成，并发请求不会重复记录
+        """
+        key = (ip_address, path)
+        with self._lock:
+            self._rollover()
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            day = self._day
+        if self.db_fallback and self._exists_in_db(ip_address, path, day):
+            return False
+        return True
+
+    def discard(self, ip_address, path):
+        """撤销登记（记录最终未能写入时调用）"""
+        with self._lock:
+            self._seen.discard((ip_address, path))
+
+    def size(self):
+        with self._lock:
+            return len(self._seen)
+
+    def _rollover(self):
+        today = date.today()
+        if self._day != today:
+            self._day = today
+            self._seen = set()
+
+    @staticmethod
+    def _day_start(day):
+        return datetime.combine(day, datetime.min.time())
+
+    def _exists_in_db(self, ip_address, path, day):
+        return db.session.query(Visit.id).filter(
+            Visit.ip_address == ip_address,
+            Visit.path == path,
+            Visit.timestamp >= self._day_start(day)
+        ).first() is not None
+
+
+class VisitBuffer:
+    """
+    访问记录写缓冲 (write-behind)
+    请求线程只把访问记录放入内存队列并立即返回，
+    后台线程每隔 flush_interval_ms 毫秒或攒够 max_rows 条时，
+    在一个事务中批量写入 Visit 表。进程退出时会把剩余记录全部落库。
+    on_flushed(rows): 批量写入提交成功后调用（如计入排行榜）
+    on_dropped(rows): 批量写入失败、记录被丢弃时调用（如撤销去重登记）
+    """
+
+    def __init__(self, app, flush_interval_ms=500, max_rows=200, max_queue=10000,
+                 on_flushed=None, on_dropped=None):
+        self.app = app
+        self.on_flushed = on_flushed
+        self.on_dropped = on_dropped
+        self.flush_interval = max(flush_interval_ms, 10) / 1000.0
+        self.max_rows = max(max_rows, 1)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._flush_lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        atexit.register(self.stop)
+
+    def submit(self, path, ip_address, timestamp=None):
+        """
+        提交一条访问记录，返回 False 表示队列已满（调用方应同步写入）
+        """
+        self._ensure_started()
+        row = {
+            'path': path,
+            'ip_address': ip_address,
+            'timestamp': timestamp or datetime.utcnow(),
+        }
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            return False
+        if self._queue.qsize() >= self.max_rows:
+            self._wakeup.set()
+        return True
+
+    def pending(self):
+        """当前尚未落库的记录数"""
+        return self._queue.qsize()
+
+    def flush(self):
+        """把队列中的记录一次性写入数据库，返回写入条数"""
+        with self._flush_lock:
+            rows = []
+            while True:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not rows:
+                return 0
+            with self.app.app_context():
+                try:
+                    db.session.execute(Visit.__table__.insert(), rows)
+                    VisitDailyRollup.add_visits(rows)
+                    db.session.commit()
+                except Exception as exc:
+                    db.session.rollback()
+                    self.app.logger.error('Visit flush failed, %d rows dropped: %s', len(rows), exc)
+                    if self.on_dropped:
+                        self.on_dropped(rows)
+                    return 0
+                finally:
+                    db.session.remove()
+            if self.on_flushed:
+                self.on_flushed(rows)
+            return len(rows)
+
+    def stop(self):
+        """停止后台线程并落库剩余记录（进程退出时自动调用）"""
+        self._stopping.set()
+        self._wakeup.set()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self.flush()
+
+    def _ensure_started(self):
+        # 按进程启动：fork 出来的 worker 不会继承父进程的线程
+        if self._thread is not None and self._pid == os.getpid():
+            return
+        with self._start_lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='visit-flusher', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+class TopArticlesBoard:
+    """
+    热门文章排行榜
+    在内存中按天维护 /docs/ 路径的访问计数（最近 30 天 + 历史总计），
+    启动时从访问日汇总表加载，之后随每次记录的访问递增。
+    每隔 refresh_seconds 秒从汇总表重新加载一次，让多进程之间的计数保持一致。
+    """
+
+    PREFIX = '/docs/'
+    WINDOWS = {'all': None, '7d': 7, '30d': 30}
+    MAX_LIMIT = 20
+
+    def __init__(self, refresh_seconds=300):
+        self.refresh_seconds = refresh_seconds
+        self._total = Counter()
+        self._daily = {}
+        self._ranked = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+
+    def reload(self):
+        """从访问日汇总表重新加载计数（需在 app_context 中调用）"""
+        since = self._window_start(self.WINDOWS['30d'])
+        rows = db.session.query(
+            VisitDailyRollup.date, VisitDailyRollup.path, VisitDailyRollup.count
+        ).filter(VisitDailyRollup.path.like(self.PREFIX + '%')).all()
+        total = Counter()
+        daily = {}
+        for day, path, count in rows:
+            total[path] += count
+            if day >= since:
+                daily.setdefault(day, Counter())[path] += count
+        with self._lock:
+            self._total = total
+            self._daily = daily
+            self._ranked = {}
+            self._loaded_at = time.monotonic()
+
+    def add(self, path, day):
+        """
+        登记一次已记录的访问
+        已缓存的排名就地更新，只有该路径可能新进入排名的窗口才丢弃缓存；
+        新的一天开始时清理 30 天窗口之外的日计数（refresh_seconds 为 0 时不会重新加载）
+        """
+        if not path.startswith(self.PREFIX):
+            return
+        with self._lock:
+            self._total[path] += 1
+            if day not in self._daily:
+                since = day - timedelta(days=self.WINDOWS['30d'] - 1)
+                for old in [old for old in self._daily if old < since]:
+                    del self._daily[old]
+                self._daily[day] = Counter()
+            self._daily[day][path] += 1
+            for key in list(self._ranked):
+                window, ranked_day = key
+                if ranked_day != day:
+                    del self._ranked[key]  # 其他日期的缓存不会再被查询
+                elif not self._bump(self._ranked[key], path, self._count(path, self.WINDOWS[window], day)):
+                    del self._ranked[key]
+
+    def top(self, limit=3, window='all'):
+        """
+        返回 [(path, count), ...]，按访问次数倒序（需在 app_context 中调用）
+        排名按 (窗口, 日期) 缓存，新的访问就地更新缓存，只有可能改变前 MAX_LIMIT 名的组成或跨天后才重新计算
+        """
+        if self.refresh_seconds and time.monotonic() - self._loaded_at >= self.refresh_seconds:
+            self.reload()
+        key = (window, datetime.utcnow().date())
+        with self._lock:
+            ranked = self._ranked.get(key)
+            if ranked is None:
+                ranked = self._rank(self.WINDOWS[window])
+                self._ranked[key] = ranked
+        return ranked[:min(limit, self.MAX_LIMIT)]
+
+    def _rank(self, days):
+        if days is None:
+            counts = self._total
+        else:
+            since = self._window_start(days)
+            counts = Counter()
+            for day, day_counts in self._daily.items():
+                if day >= since:
+                    counts.update(day_counts)
+        return heapq.nlargest(self.MAX_LIMIT, counts.items(), key=lambda item: item[1])
+
+    def _count(self, path, days, today):
+        """path 在以 today 结束的窗口内的访问次数"""
+        if days is None:
+            return self._total[path]
+        since = today - timedelta(days=days - 1)
+        return sum(counts.get(path, 0) for day, counts in self._daily.items() if day >= since)
+
+    @classmethod
+    def _bump(cls, ranked, path, count):
+        """
+        path 的计数增加到 count 后就地更新排名，返回 False 表示排名需要重新计算
+        （path 不在排名中但计数已超过最后一名，或排名尚未满）
+        """
+        for index, (item, _) in enumerate(ranked):
+            if item == path:
+                ranked[index] = (path, count)
+                while index > 0 and ranked[index - 1][1] < count:
+                    ranked[index - 1], ranked[index] = ranked[index], ranked[index - 1]
+                    index -= 1
+                return True
+        return len(ranked) >= cls.MAX_LIMIT and count <= ranked[-1][1]
+
+    @staticmethod
+    def _window_start(days):
+        return datetime.utcnow().date() - timedelta(days=days - 1)
@@ -0,0 +1,310 @@
+"""
+上游 HTTP 客户端
+按 (scheme, host, port) 复用 keep-alive 连接，响应体可以分块读取后直接转发给浏览器；
+每个主机的并发请求数有上限，超出的请求在有界队列中等待，队列满或等待超时时直接拒绝。
+"""
+import http.client
+import ssl
+import threading
+import time
+from urllib.parse import urljoin, urlsplit
+
+
+class UpstreamError(Exception):
+    """上游请求失败（连接错误、超时、HTTP 错误状态或重定向过多）"""
+
+
+class UpstreamBusy(UpstreamError):
+    """上游主机的并发数已满且等待队列已满（或等待超时）"""
+
+
+class UpstreamResponse:
+    """
+    上游响应
+    必须读完 (read / iter_chunks) 或调用 close()，连接才会归还到连接池，并发名额才会释放
+    """
+
+    def __init__(self, pool, key, conn, raw, url):
+        self._pool = pool
+        self._key = key
+        self._conn = conn
+        self._raw = raw
+        self.url = url
+        self.status = raw.status
+        self.reason = raw.reason
+        self.headers = raw.headers
+
+    def read(self):
+        """读取全部响应体"""
+        try:
+            data = self._raw.read()
+        except Exception:
+            self.close()
+            raise
+        self._release()
+        return data
+
+    def iter_chunks(self, chunk_size=64 * 1024):
+        """按块读取响应体，中途中断（如浏览器断开）时关闭连接而不是归还"""
+        completed = False
+        try:
+            while True:
+                chunk = self._raw.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+            completed = True
+        finally:
+            if completed:
+                self._release()
+            else:
+                self.close()
+
+    def iter_lines(self):
+        """逐行读取响应体（用于 text/event-stream），每行到达后立即返回而不等待缓冲区填满"""
+        completed = False
+        try:
+            while True:
+                line = self._raw.readline()
+                if not line:
+                    break
+                yield line
+            completed = True
+        finally:
+            if completed:
+                self._release()
+            else:
+                self.close()
+
+    def close(self):
+        """丢弃连接（响应体未读完时使用）"""
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+            self._pool._release_slot(self._key)
+
+    def _release(self):
+        if self._conn is None:
+            return
+        if self._raw.will_close:
+            self.close()
+        else:
+            self._pool._put(self._key, self._conn)
+            self._conn = None
+            self._pool._release_slot(self._key)
+
+
+class UpstreamPool:
+    """
+    带连接池的上游客户端
+    max_idle_per_host: 每个主机最多保留的空闲连接数
+    idle_timeout: 空闲连接超过这么多秒不再复用
+    timeout: 连接和读取超时（秒）
+    max_active_per_host: 每个主机同时进行的请求数上限（从发出请求到响应体读完）
+    max_waiting_per_host: 每个主机排队等待名额的请求数上限，超出时立即抛出 UpstreamBusy
+    queue_timeout: 排队等待名额的最长时间（秒）
+    """
+
+    def __init__(self, max_idle_per_host=4, idle_timeout=30, timeout=8, max_redirects=5, user_agent=None,
+                 max_active_per_host=8, max_waiting_per_host=16, queue_timeout=5):
+        self.max_idle_per_host = max_idle_per_host
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.max_redirects = max_redirects
+        self.user_agent = user_agent
+        self.max_active_per_host = max_active_per_host
+        self.max_waiting_per_host = max_waiting_per_host
+        self.queue_timeout = queue_timeout
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._slots = {}  # key -> {'active': n, 'waiting': n}
+        self._slots_cond = threading.Condition()
+        self._rejected = 0
+        self._ssl_context = ssl.create_default_context()
+
+    def request(self, method, url, body=None, headers=None):
+        """
+        发送请求并返回 UpstreamResponse（响应头已读取，响应体尚未读取）
+        自动跟随重定向；状态码 >= 400 时抛出 UpstreamError
+        """
+        headers = dict(headers or {})
+        if self.user_agent:
+            headers.setdefault('User-Agent', self.user_agent)
+        for _ in range(self.max_redirects + 1):
+            response = self._send(method, url, body, headers)
+            location = response.headers.get('Location')
+            if response.status in (301, 302, 303, 307, 308) and location:
+                response.read()
+                url = urljoin(url, location)
+                if response.status in (301, 302, 303) and method != 'HEAD':
+                    method, body = 'GET', None
+                    headers.pop('Content-Type', None)
+                continue
+            if response.status >= 400:
+                response.close()
+                raise UpstreamError(f'HTTP Error {response.status}: {response.reason}')
+            return response
+        raise UpstreamError('Too many redirects')
+
+    def stats(self):
+        """各主机的空闲连接数、进行中和排队中的请求数，以及因并发已满被拒绝的总次数"""
+        hosts = {}
+        with self._lock:
+            for key, conns in self._idle.items():
+                hosts.setdefault(key, {'idle': 0, 'active': 0, 'waiting': 0})['idle'] = len(conns)
+        with self._slots_cond:
+            for key, slot in self._slots.items():
+                hosts.setdefault(key, {'idle': 0, 'active': 0, 'waiting': 0}).update(slot)
+            rejected = self._rejected
+        return {
+            'hosts': {f'{scheme}://{host}:{port}': value for (scheme, host, port), value in hosts.items()},
+            'rejected': rejected,
+        }
+
+    def _send(self, method, url, body, headers):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise UpstreamError(f'Unsupported URL: {url}')
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        host_header = parts.hostname if parts.port is None else f'{parts.hostname}:{parts.port}'
+
+        self._acquire_slot(key)
+        try:
+            conn, raw = self._exchange(key, method, target, host_header, body, headers)
+        except Exception:
+            self._release_slot(key)
+            raise
+        return UpstreamResponse(self, key, conn, raw, url)
+
+    def _exchange(self, key, method, target, host_header, body, headers):
+        conn, reused = self._get(key)
+        try:
+            conn.putrequest(method, target, skip_host=True, skip_accept_encoding=True)
+            conn.putheader('Host', host_header)
+            for name, value in headers.items():
+                conn.putheader(name, value)
+            if body is not None:
+                conn.putheader('Content-Length', str(len(body)))
+            conn.endheaders(body)
+            raw = conn.getresponse()
+        except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+            conn.close()
+            # 复用的空闲连接可能已被服务器关闭，幂等请求换一条新连接重试一次
+            if reused and method in ('GET', 'HEAD'):
+                return self._exchange(key, method, target, host_header, body, headers)
+            raise
+        except Exception:
+            conn.close()
+            raise
+        return conn, raw
+
+    def _acquire_slot(self, key):
+        """占用该主机的一个并发名额，名额已满时排队等待"""
+        deadline = time.monotonic() + self.queue_timeout
+        with self._slots_cond:
+            slot = self._slots.setdefault(key, {'active': 0, 'waiting': 0})
+            if slot['active'] < self.max_active_per_host:
+                slot['active'] += 1
+                return
+            if slot['waiting'] >= self.max_waiting_per_host:
+                self._rejected += 1
+                raise UpstreamBusy(f'Too many concurrent requests to {key[1]}')
+            slot['waiting'] += 1
+            try:
+                while slot['active'] >= self.max_active_per_host:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._rejected += 1
+                        raise UpstreamBusy(f'Timed out waiting for {key[1]}')
+                    self._slots_cond.wait(remaining)
+                slot['active'] += 1
+            finally:
+                slot['waiting'] -= 1
+
+    def _release_slot(self, key):
+        with self._slots_cond:
+            slot = self._slots[key]
+            slot['active'] -= 1
+            if not slot['active'] and not slot['waiting']:
+                del self._slots[key]
+            self._slots_cond.notify_all()
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            conns = self._idle.get(key, [])
+            while conns:
+                conn, idle_since = conns.pop()
+                if now - idle_since < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        scheme, host, port = key
+        if scheme == 'https':
+            conn = http.client.HTTPSConnection(host, port, timeout=self.timeout, context=self._ssl_context)
+        else:
+            conn = http.client.HTTPConnection(host, port, timeout=self.timeout)
+        return conn, False
+
+    def _put(self, key, conn):
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.max_idle_per_host:
+                conns.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+
+class SingleFlight:
+    """
+    合并并发的相同请求：同一个 key 同时只有一个调用方（leader）真正访问上游，
+    其余调用方（follower）等待 leader 通过 finish() 给出的结果。
+    leader 结果为 None 表示无法共享（如二进制流），follower 需要自己请求。
+    """
+
+    def __init__(self):
+        self._flights = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+
+    def begin(self, key):
+        """返回 (flight, is_leader)"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                self.coalesced += 1
+                return flight, False
+            flight = _Flight(self, key)
+            self._flights[key] = flight
+            return flight, True
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._flights), 'coalesced': self.coalesced}
+
+
+class _Flight:
+    def __init__(self, group, key):
+        self._group = group
+        self.key = key
+        self.result = None
+        self._event = threading.Event()
+
+    def finish(self, result=None):
+        """由 leader 调用，只有第一次调用生效"""
+        with self._group._lock:
+            if self._event.is_set():
+                return
+            if self._group._flights.get(self.key) is self:
+                del self._group._flights[self.key]
+            self.result = result
+            self._event.set()
+
+    def wait(self, timeout):
+        """等待 leader 的结果，超时或结果不可共享时返回 None"""
+        if not self._event.wait(timeout):
+            return None
+        return self.result